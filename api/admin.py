@@ -1,6 +1,11 @@
+from django import forms
 from django.contrib import admin
-from django.db.models import Q
-from api.models import Product, Brand, User, CartItem, Cart
+from django.contrib.admin.views.main import IS_FACETS_VAR, ORDER_VAR, PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+from api.models import Product, ProductFacet, Brand, User, CartItem, Cart, price_range_condition
 
 
 class PriceRangeFilter(admin.SimpleListFilter):
@@ -8,32 +13,117 @@ class PriceRangeFilter(admin.SimpleListFilter):
     parameter_name = 'price_range'
 
     def lookups(self, request, model_admin):
-        return [
-            ('0-10', 'Under $10'),
-            ('11-50', '$11 - $50'),
-            ('51-100', '$51 - $100'),
-            ('101-', 'Over $100'),
-        ]
+        return [(key, label) for key, label, _ in Product.PRICE_RANGES]
 
     def queryset(self, request, queryset):
-        if self.value() == '0-10':
-            return queryset.filter(price__range=(0, 10))
-        if self.value() == '11-50':
-            return queryset.filter(price__range=(11, 50))
-        if self.value() == '51-100':
-            return queryset.filter(price__range=(51, 100))
-        if self.value() == '101-':
-            return queryset.filter(price__gte=101)
+        if self.value() in {key for key, _, _ in Product.PRICE_RANGES}:
+            return queryset.filter_by_price_range(self.value())
         return queryset
 
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        # Price bounds rather than the default `pk IN (subquery)` per bucket.
+        return {
+            f'{i}__c': Count(pk_attname, filter=price_range_condition(key))
+            for i, (key, _, _) in enumerate(Product.PRICE_RANGES)
+        }
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    A related-field filter that looks values up through the admin
+    autocomplete view as the user types, instead of rendering every related
+    object in the sidebar. Needs `search_fields` on the related model's admin
+    and `autocomplete_filter.js` in the model admin's media.
+    """
+    template = 'admin/api/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.app_label = model._meta.app_label
+        self.model_name = model._meta.model_name
+        self.field_name = field.name
+
+    def field_choices(self, field, request, model_admin):
+        # Only the selected values are listed.
+        if not self.lookup_val:
+            return []
+        return field.get_choices(include_blank=False, limit_choices_to={'pk__in': self.lookup_val})
+
+    def has_output(self):
+        return True
+
+class FacetCountPaginator(Paginator):
+    """
+    Takes the changelist count from the ProductFacet summary when every
+    active filter is one of its keys, instead of a COUNT(*) over the
+    product table. The summary is kept current by signals, so this is an
+    estimate only while bulk writes that bypass them await a rebuild.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, facets=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.facets = facets
+
+    @cached_property
+    def count(self):
+        if self.facets is None:
+            return super().count
+        return ProductFacet.objects.filter(**self.facets).total()
+
+# Changelist parameter -> ProductFacet lookup, for the filters the summary can answer.
+FACET_PARAMS = {
+    'brand__id__exact': 'brand_id',
+    'category__exact': 'category',
+    'gender__exact': 'gender',
+    'price_range': 'price_range',
+}
+
+def facet_filters(params):
+    """ProductFacet lookups equivalent to the changelist `params`, or None if there are none."""
+    facets = {}
+    for name, values in params.lists():
+        if name in (PAGE_VAR, ORDER_VAR, IS_FACETS_VAR):
+            continue
+        if name not in FACET_PARAMS or len(values) != 1:
+            return None
+        if name == 'price_range' and values[0] not in {key for key, _, _ in Product.PRICE_RANGES}:
+            continue  # Ignored by PriceRangeFilter as well.
+        facets[FACET_PARAMS[name]] = values[0]
+    return facets
+
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'brand', 'category', 'gender', 'price')
-    list_filter = ('brand', 'category', 'gender', PriceRangeFilter)
+    list_filter = (('brand', AutocompleteFilter), 'category', 'gender', PriceRangeFilter)
+    list_select_related = ('brand',)
+    autocomplete_fields = ('brand',)
     search_fields = ('name', 'description')
     list_per_page = 25
+    paginator = FacetCountPaginator
+    # The unfiltered total would be a second COUNT(*) on every page.
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        autocomplete = AutocompleteSelect(Product._meta.get_field('brand'), self.admin_site)
+        return super().media + autocomplete.media + forms.Media(js=['api/js/autocomplete_filter.js'])
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page, facets=facet_filters(request.GET),
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE '%term%' over description.
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+class BrandAdmin(admin.ModelAdmin):
+    # Backs the brand autocomplete; ordered by the unique index on name.
+    search_fields = ('name',)
+    ordering = ('name',)
 
 admin.site.register(Product, ProductAdmin)
-admin.site.register(Brand)
+admin.site.register(Brand, BrandAdmin)
 admin.site.register(User)
 admin.site.register(Cart)
-admin.site.register(CartItem)
\ No newline at end of file
+admin.site.register(CartItem)
@@ -0,0 +1,7 @@
+"""Root URLconf with every async-capable API route switched to its async view."""
+from django.urls import include, path
+from .urls import ASYNC_VIEWS, api_urlpatterns
+
+urlpatterns = [
+    path('api/', include(api_urlpatterns(ASYNC_VIEWS))),
+]
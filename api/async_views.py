@@ -0,0 +1,191 @@
+"""
+ASGI-native variants of the product and cart views.
+
+Reads use Django's async ORM (aiterator, aget_or_create, aupdate), so
+under an ASGI server they don't tie up a worker thread each. Model
+instances are fully loaded (related rows via select_related/prefetch)
+before the regular DRF serializers run, so serialization never touches
+the database. Write methods that have no async path delegate to the
+sync DRF views. Enable a variant per route with API_ASYNC_ROUTES.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import get_catalog_cache, response_cache_key
+from .cart_store import get_cart_store
+from .conditional import acart_validators, acatalog_validators, not_modified, set_validators
+from .models import Product
+from .pagination import ProductKeysetPagination
+from .serializers import CartItemSerializer, ProductSerializer
+from .views import ProductListCreate, ProductRetrieveUpdateDestroy, filter_products
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    # Same renderer as the DRF views, so both variants return identical bytes.
+    return HttpResponse(
+        JSONRenderer().render(data), status=status_code, content_type='application/json',
+    )
+
+
+def error(detail, status_code):
+    # As DRF's exception_handler: field errors are the body, messages are wrapped.
+    return render(detail if isinstance(detail, (list, dict)) else {'detail': detail}, status_code)
+
+
+def delegate(view_class):
+    """An async handler that forwards the request to a sync DRF view."""
+    view = sync_to_async(view_class.as_view())
+
+    async def handler(self, request, *args, **kwargs):
+        return await view(request, *args, **kwargs)
+    return handler
+
+
+class AsyncAPIView(View):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # As with DRF's APIView, CSRF is only enforced by session authentication.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return error(exc.detail, exc.status_code)
+
+
+class CachedCatalogView(AsyncAPIView):
+    cache_params = ()
+
+    def cache_key(self, prefix, request):
+        # Cache lookups are a local-memory or Redis round trip, cheaper
+        # than the thread hop sync_to_async() would add to every request.
+        return response_cache_key(prefix, request.get_host(), request.GET, self.cache_params)
+
+
+class AsyncProductListCreate(CachedCatalogView):
+    cache_params = ProductListCreate.cache_params
+
+    async def get(self, request):
+        cache = get_catalog_cache()
+        key = self.cache_key('product-list', request)
+        validators = await acatalog_validators(key)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        data = cache.get(key)
+        if data is None:
+            data = await self.listing(request)
+            cache.set(key, data)
+        return set_validators(render(data), validators)
+
+    async def listing(self, request):
+        queryset = filter_products(Product.objects.select_related('brand'), request.GET)
+        ordering = [
+            field.strip() for field in request.GET.get('ordering', '').split(',')
+            if field.strip().lstrip('-') in ProductListCreate.ordering_fields
+        ]
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+
+        paginator = ProductKeysetPagination()
+        page = paginator.page_queryset(queryset, request)
+        if page is None:
+            products = [product async for product in queryset.aiterator()]
+            return ProductSerializer(products, many=True).data
+        products = paginator.paginate_results([product async for product in page])
+        return {'next': paginator.get_next_link(), 'results': ProductSerializer(products, many=True).data}
+
+    post = delegate(ProductListCreate)
+
+
+class AsyncProductRetrieveUpdateDestroy(CachedCatalogView):
+    async def get(self, request, pk):
+        cache = get_catalog_cache()
+        key = self.cache_key(f'product-{pk}', request)
+        validators = await acatalog_validators(key)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        data = cache.get(key)
+        if data is None:
+            product = await Product.objects.select_related('brand').filter(pk=pk).afirst()
+            if product is None:
+                return error('No Product matches the given query.', status.HTTP_404_NOT_FOUND)
+            data = ProductSerializer(product).data
+            cache.set(key, data)
+        return set_validators(render(data), validators)
+
+    put = patch = delete = delegate(ProductRetrieveUpdateDestroy)
+
+
+class AsyncCartView(AsyncAPIView):
+    """
+    Authentication and parsing are DRF's own: the request is wrapped in a
+    DRF Request with the default authenticators and parsers, and the
+    authenticators run in a worker thread since they may query the database.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+
+    def initialize_request(self, request):
+        return Request(
+            request,
+            parsers=[parser() for parser in self.parser_classes],
+            authenticators=[auth() for auth in self.authentication_classes],
+        )
+
+    @staticmethod
+    def authenticate(request):
+        # As APIView.perform_authentication() followed by IsAuthenticated.
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+
+    def authentication_failed(self, request, exc):
+        # As APIView.handle_exception(): 401 with a challenge when the first
+        # authenticator offers one, otherwise 403.
+        header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+        if header is None:
+            return error(exc.detail, status.HTTP_403_FORBIDDEN)
+        response = error(exc.detail, exc.status_code)
+        response['WWW-Authenticate'] = header
+        return response
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = self.initialize_request(request)
+        try:
+            await sync_to_async(self.authenticate)(request)
+        except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as exc:
+            return self.authentication_failed(request, exc)
+        except exceptions.APIException as exc:  # e.g. a CSRF failure
+            return error(exc.detail, exc.status_code)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request):
+        store = get_cart_store()
+        validators = await acart_validators(await store.aversion(request.user))
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        return set_validators(render(await store.aget(request.user)), validators)
+
+    async def post(self, request):
+        serializer = CartItemSerializer(data=request.data)
+        # Validating product_id looks the product up.
+        if not await sync_to_async(serializer.is_valid)():
+            return render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        product = serializer.validated_data['product']
+        quantity = serializer.validated_data.get('quantity', 1)
+        cart = await get_cart_store().aadd(request.user, product, quantity)
+        return render(cart, status.HTTP_201_CREATED)
+
+    async def delete(self, request):
+        if not await get_cart_store().aclear(request.user):
+            return error('No Cart matches the given query.', status.HTTP_404_NOT_FOUND)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
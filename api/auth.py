@@ -0,0 +1,94 @@
+"""
+Authentication that resolves the user without database queries.
+
+- SignedTokenAuthentication: stateless `Authorization: Bearer <token>`
+  tokens, signed with SECRET_KEY and carrying the user's id and
+  `token_epoch`. Incrementing the epoch (logout, password change, or
+  revoke_tokens()) revokes every token issued before.
+- CachedModelBackend: ModelBackend whose get_user() reads the cache, so
+  with the cached_db session engine (used when the cache is shared) a
+  session request needs no queries either.
+
+Users are cached in the default cache under their id; api.signals drops
+the entry whenever the row is saved or deleted. With several server
+processes the default cache must be shared (e.g. Redis), or revocations
+only reach the process that made them.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+TOKEN_SALT = 'api.auth.token'
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """The user with `user_id`, from the cache when possible, or None."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model()._default_manager.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, settings.API_USER_CACHE_TIMEOUT)
+    return user
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def issue_token(user):
+    return signing.dumps([user.pk, user.token_epoch], salt=TOKEN_SALT)
+
+
+def revoke_tokens(user):
+    """Invalidates every token issued to `user` so far."""
+    type(user)._default_manager.filter(pk=user.pk).update(token_epoch=F('token_epoch') + 1)
+    user.refresh_from_db(fields=['token_epoch'])
+    forget_user(user.pk)
+
+
+def user_for_token(token):
+    """The active user `token` was issued to, or AuthenticationFailed."""
+    try:
+        user_id, epoch = signing.loads(token, salt=TOKEN_SALT, max_age=settings.API_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    user = get_cached_user(user_id)
+    if user is None or not user.is_active or user.token_epoch != epoch:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        token = auth[1].decode(errors='replace')
+        return user_for_token(token), token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
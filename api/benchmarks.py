@@ -0,0 +1,689 @@
+"""
+Benchmark scenarios run by `manage.py benchmark`.
+
+Each scenario runs against a throwaway, freshly migrated database and
+returns a JSON-serializable dict of results.
+"""
+import asyncio
+import base64
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from rest_framework.renderers import JSONRenderer
+
+from .auth import issue_token
+from .cart_store import DatabaseCartStore, WriteBehindCartStore
+from .fast_serializers import brand_rows, cart_rows, product_rows
+from .models import Brand, Cart, CartItem, Product, User
+from .pagination import apply_keyset, encode_cursor
+from .serializers import BrandSerializer, CartSerializer, ProductSerializer
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+@contextmanager
+def benchmark_database():
+    # Use an on-disk database: an in-memory one behaves differently under
+    # concurrent access and is not what the server runs against.
+    fd, path = tempfile.mkstemp(suffix='.sqlite3', prefix='benchmark-')
+    os.close(fd)
+    connection.settings_dict['TEST']['NAME'] = path
+    setup_test_environment()
+    # Other aliases, such as the read replica, mirror it in tests.
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def timed(func, repeat):
+    """Returns the median wall time of `func` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def seed_catalog(count, seed=0, **options):
+    call_command('populate_data', count=count, brands=20, seed=seed, stdout=io.StringIO(), **options)
+
+
+@scenario('pagination')
+def pagination(options):
+    """Keyset page latency from page 1 to page 10,000, against OFFSET paging."""
+    page_size = 20
+    products = options['products'] or 200000
+    seed_catalog(products)
+    client = Client()
+    ordered = Product.objects.order_by('price', 'pk')
+    results = []
+    # Cache hits after the first repeat would time the cache, not the pages.
+    with override_settings(CACHES=NO_CATALOG_CACHE):
+        for page in (1, 10, 100, 1000, 10000):
+            offset = (page - 1) * page_size
+            if offset >= products:
+                break
+            position = ordered.values_list('price', 'pk')[offset - 1] if offset else None
+            params = {'page_size': page_size}
+            if position:
+                params['cursor'] = encode_cursor(position)
+            keyset = Product.objects.all()
+            repeat = options['repeat']
+            results.append({
+                'page': page,
+                'keyset_request_ms': round(timed(lambda: client.get('/api/products/', params), repeat), 3),
+                'keyset_query_ms': round(timed(lambda: list(apply_keyset(keyset, position)[:page_size]), repeat), 3),
+                'offset_query_ms': round(timed(lambda: list(ordered[offset:offset + page_size]), repeat), 3),
+            })
+    return {'products': products, 'page_size': page_size, 'pages': results}
+
+
+def legacy_add_product(cart, product, quantity):
+    # The add-to-cart implementation CartView used before the atomic upsert.
+    cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
+    if not created:
+        cart_item.quantity += quantity
+    else:
+        cart_item.quantity = quantity
+    cart_item.save()
+
+
+def atomic_add_product(cart, product, quantity):
+    cart.add_product(product, quantity)
+
+
+@scenario('add_to_cart')
+def add_to_cart(options):
+    """Concurrent add-to-cart throughput and lost updates, legacy against atomic."""
+    threads, adds = options['threads'], options['operations']
+    seed_catalog(10)
+    product = Product.objects.first()
+    results = {}
+    for name, add in (('legacy', legacy_add_product), ('atomic', atomic_add_product)):
+        cart = Cart.objects.create(user=User.objects.create_user(username=f'bench-{name}'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            add(cart, product, 1)
+            add(cart, product, 1)
+        queries_per_add = len(ctx.captured_queries) / 2
+
+        def worker():
+            try:
+                for _ in range(adds):
+                    add(cart, product, 1)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            for future in [pool.submit(worker) for _ in range(threads)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        expected = 2 + threads * adds
+        actual = CartItem.objects.get(cart=cart, product=product).quantity
+        results[name] = {
+            'queries_per_add': queries_per_add,
+            'adds_per_sec': round(threads * adds / elapsed, 1),
+            'lost_updates': expected - actual,
+        }
+    return {'threads': threads, 'adds_per_thread': adds, 'results': results}
+
+
+class InProcessClient:
+    """Drives the app through the Django test client, counting queries."""
+    counts_queries = True
+
+    def __init__(self, user=None):
+        self.client = Client()
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            if method == 'GET':
+                response = self.client.get(path, data)
+            else:
+                response = self.client.generic(method, path, json.dumps(data or {}), 'application/json')
+        return response.status_code, len(ctx.captured_queries)
+
+
+class LiveClient:
+    """Drives an already running dev or ASGI server over HTTP."""
+    counts_queries = False
+
+    def __init__(self, base_url, auth=None):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Content-Type': 'application/json'}
+        if auth:
+            self.headers['Authorization'] = 'Basic ' + base64.b64encode(auth.encode()).decode()
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        if method == 'GET' and data:
+            url += '?' + urlencode(data)
+        elif data is not None:
+            body = json.dumps(data).encode()
+        try:
+            with urlopen(Request(url, body, self.headers, method=method)) as response:
+                response.read()
+                return response.status, None
+        except HTTPError as error:
+            return error.code, None
+
+    def product_ids(self):
+        with urlopen(f'{self.base_url}/api/products/?page_size=200') as response:
+            return [product['id'] for product in json.load(response)['results']]
+
+
+def random_listing_params(rng, brand_names):
+    params = {}
+    if rng.random() < 0.5:
+        params['category'] = rng.choice(Product.CATEGORY_CHOICES)[0]
+    if rng.random() < 0.4:
+        params['gender'] = rng.choice(Product.GENDER_CHOICES)[0]
+    if brand_names and rng.random() < 0.3:
+        params['brand'] = rng.choice(brand_names)
+    if rng.random() < 0.3:
+        low = rng.randint(0, 80)
+        params['min_price'], params['max_price'] = low, low + rng.randint(5, 50)
+    if rng.random() < 0.5:
+        params['ordering'] = rng.choice(['price', '-price'])
+    params['page_size'] = 20
+    return params
+
+
+# Caches for scenarios that measure the views and the database: catalog
+# cache hits would hide them, so every request goes to the database.
+NO_CATALOG_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalog': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+# (weight, endpoint label) pairs for the mixed workload.
+WORKLOAD = [
+    (45, 'GET /api/products/'),
+    (20, 'GET /api/products/<pk>/'),
+    (10, 'GET /api/brands/'),
+    (12, 'GET /api/cart/'),
+    (10, 'POST /api/cart/'),
+    (3, 'DELETE /api/cart/'),
+]
+
+
+def percentile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    for label, entries in sorted(samples.items()):
+        latencies = sorted(latency for latency, _, _ in entries)
+        queries = [count for _, _, count in entries if count is not None]
+        statuses = {}
+        for _, code, _ in entries:
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+        endpoints[label] = {
+            'requests': len(entries),
+            'throughput_rps': round(len(entries) / elapsed, 1),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 3),
+                'p50': round(percentile(latencies, 0.5), 3),
+                'p95': round(percentile(latencies, 0.95), 3),
+                'p99': round(percentile(latencies, 0.99), 3),
+            },
+            'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'status': statuses,
+        }
+    return endpoints
+
+
+@scenario('api')
+def api(options):
+    """Mixed read/write workload over the catalog and cart endpoints."""
+    rng = random.Random(options['seed'])
+    if options['base_url']:
+        clients = [LiveClient(options['base_url'], options['auth'])]
+        product_ids = clients[0].product_ids()
+        brand_names = []
+    else:
+        seed_catalog(options['products'] or 20000, seed=options['seed'], users=options['users'])
+        clients = [InProcessClient(user) for user in User.objects.all()[:options['users']]]
+        product_ids = list(Product.objects.values_list('pk', flat=True)[:5000])
+        brand_names = list(Brand.objects.values_list('name', flat=True))
+
+    weights, labels = zip(*WORKLOAD)
+    samples = {label: [] for label in labels}
+    # Clearing an empty cart is a 404 by design; don't log every one.
+    request_logger = logging.getLogger('django.request')
+    previous_level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    start = time.perf_counter()
+    try:
+        for _ in range(options['requests']):
+            label = rng.choices(labels, weights)[0]
+            method, path = label.split(' ')
+            data = None
+            if path == '/api/products/':
+                data = random_listing_params(rng, brand_names)
+            elif path == '/api/products/<pk>/':
+                path = f'/api/products/{rng.choice(product_ids)}/'
+            elif method == 'POST':
+                data = {'product_id': rng.choice(product_ids), 'quantity': rng.randint(1, 3)}
+            client = rng.choice(clients)
+            request_start = time.perf_counter()
+            code, queries = client.request(method, path, data)
+            samples[label].append(((time.perf_counter() - request_start) * 1000, code, queries))
+    finally:
+        request_logger.setLevel(previous_level)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'config': {
+            'target': options['base_url'] or 'in-process',
+            'products': options['products'] or (None if options['base_url'] else 20000),
+            'users': len(clients),
+            'requests': options['requests'],
+            'seed': options['seed'],
+        },
+        'total': {
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(options['requests'] / elapsed, 1),
+        },
+        'endpoints': summarize(samples, elapsed),
+    }
+
+
+async def drive_connections(users, product_ids, operations, seed):
+    """One concurrent connection per user, each issuing `operations` requests back to back."""
+    async def connection_worker(user, rng):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        latencies = []
+        for _ in range(operations):
+            roll = rng.random()
+            request_start = time.perf_counter()
+            if roll < 0.6:
+                await client.get('/api/products/', random_listing_params(rng, []))
+            elif roll < 0.8:
+                await client.get(f'/api/products/{rng.choice(product_ids)}/')
+            elif roll < 0.9:
+                await client.get('/api/cart/')
+            else:
+                await client.post(
+                    '/api/cart/', {'product_id': rng.choice(product_ids)}, content_type='application/json',
+                )
+            latencies.append((time.perf_counter() - request_start) * 1000)
+        return latencies
+
+    start = time.perf_counter()
+    per_connection = await asyncio.gather(*[
+        connection_worker(user, random.Random(seed + index)) for index, user in enumerate(users)
+    ])
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for samples in per_connection for latency in samples)
+    return {
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.5), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+        },
+    }
+
+
+@scenario('async')
+def async_views(options):
+    """Throughput of the async views against the sync ones with concurrent ASGI connections."""
+    concurrency, operations = options['threads'], options['operations']
+    products = options['products'] or 20000
+    seed_catalog(products, seed=options['seed'], users=concurrency)
+    users = list(User.objects.all()[:concurrency])
+    product_ids = list(Product.objects.values_list('pk', flat=True)[:5000])
+    results = {}
+    for name, urlconf in (('sync', 'ecommerce_practice.urls'), ('async', 'api.async_urls')):
+        with override_settings(ROOT_URLCONF=urlconf, CACHES=NO_CATALOG_CACHE):
+            results[name] = async_to_sync(drive_connections)(
+                users, product_ids, operations, options['seed'],
+            )
+    return {
+        'products': products,
+        'connections': len(users),
+        'requests_per_connection': operations,
+        'results': results,
+    }
+
+
+@scenario('serializers')
+def serializer_throughput(options):
+    """Rows/sec of the DRF serializers against the row serializers, query to JSON bytes."""
+    products = options['products'] or 20000
+    seed_catalog(products, seed=options['seed'])
+    cart = Cart.objects.create(user=User.objects.create_user(username='bench-serializers'))
+    cart.add_products({pk: 2 for pk in Product.objects.values_list('pk', flat=True)[:200]})
+    render = JSONRenderer().render
+    cases = {
+        'product_list': (
+            products,
+            lambda: render(ProductSerializer(Product.objects.select_related('brand'), many=True).data),
+            lambda: render(product_rows.data(Product.objects.all())),
+        ),
+        'brand_list': (
+            Brand.objects.count(),
+            lambda: render(BrandSerializer(Brand.objects.order_by('name'), many=True).data),
+            lambda: render(brand_rows.data(Brand.objects.order_by('name'))),
+        ),
+        'cart': (
+            cart.items.count(),
+            lambda: render(CartSerializer(Cart.objects.with_items().get(pk=cart.pk)).data),
+            lambda: render(cart_rows.data(Cart.objects.get(pk=cart.pk))),
+        ),
+    }
+    results = {}
+    for name, (rows, drf, fast) in cases.items():
+        drf_ms, fast_ms = timed(drf, options['repeat']), timed(fast, options['repeat'])
+        results[name] = {
+            'rows': rows,
+            'drf_rows_per_sec': round(rows / drf_ms * 1000, 1),
+            'fast_rows_per_sec': round(rows / fast_ms * 1000, 1),
+            'speedup': round(drf_ms / fast_ms, 2),
+            'identical': drf() == fast(),
+        }
+    return {'products': products, 'results': results}
+
+
+def drive_cart_store(store, users, products, threads, adds, seed):
+    """`threads` workers each add `adds` random products to random users' carts."""
+    Cart.objects.all().delete()
+    product_ids = list(products)
+    errors = []
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        done = 0
+        try:
+            for _ in range(adds):
+                try:
+                    store.add(rng.choice(users), products[rng.choice(product_ids)], 1)
+                    done += 1
+                except Exception as exc:
+                    errors.append(exc)
+        finally:
+            connections.close_all()
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        succeeded = sum(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    flush_start = time.perf_counter()
+    store.close()
+    flush_ms = (time.perf_counter() - flush_start) * 1000
+
+    stored = sum(CartItem.objects.values_list('quantity', flat=True))
+    return {
+        'adds_per_sec': round(succeeded / elapsed, 1),
+        'errors': len(errors),
+        'failed_flushes': getattr(store, 'failed_flushes', 0),
+        'final_flush_ms': round(flush_ms, 3),
+        'lost_updates': succeeded - stored,
+        'drifted_carts': sum(1 for _ in Cart.objects.drifted()),
+    }
+
+
+@scenario('cart_store')
+def cart_store(options):
+    """Cart write throughput of the database store against the write-behind store."""
+    threads, adds = options['threads'], options['operations']
+    seed_catalog(1000, seed=options['seed'], users=options['users'])
+    users = list(User.objects.all()[:options['users']])
+    products = Product.objects.in_bulk()
+    stores = (
+        ('database', DatabaseCartStore()),
+        ('write_behind', WriteBehindCartStore(flush_interval=1.0)),
+    )
+    # A background flush that loses a lock race is retried; count, don't log, those.
+    store_logger = logging.getLogger('api.cart_store')
+    previous_level = store_logger.level
+    store_logger.setLevel(logging.CRITICAL)
+    try:
+        results = {
+            name: drive_cart_store(store, users, products, threads, adds, options['seed'])
+            for name, store in stores
+        }
+    finally:
+        store_logger.setLevel(previous_level)
+    return {'users': len(users), 'threads': threads, 'adds_per_thread': adds, 'results': results}
+
+
+def mixed_sqlite_worker(user, product_ids, brand_names, operations, seed, reuse_connections):
+    """Lists products (even user index) or adds to the cart (odd), returning samples."""
+    rng = random.Random(seed)
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    reader = user.pk % 2 == 0
+    label = 'GET /api/products/' if reader else 'POST /api/cart/'
+    samples = []
+    try:
+        for _ in range(operations):
+            start = time.perf_counter()
+            if reader:
+                response = client.get('/api/products/', random_listing_params(rng, brand_names))
+            else:
+                data = {'product_id': rng.choice(product_ids), 'quantity': 1}
+                response = client.post('/api/cart/', data, 'application/json')
+            if not reuse_connections:
+                # What request_finished does with CONN_MAX_AGE = 0.
+                connections.close_all()
+            samples.append(((time.perf_counter() - start) * 1000, response.status_code, None))
+    finally:
+        connections.close_all()
+    return label, samples
+
+
+def drive_mixed_sqlite_load(users, product_ids, brand_names, operations, seed, reuse_connections):
+    # Worker processes, not threads: with threads the GIL, not the database,
+    # would be what the workers wait on. Forked children inherit the settings.
+    connections.close_all()
+    samples = {'GET /api/products/': [], 'POST /api/cart/': []}
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(len(users)) as pool:
+        for label, entries in pool.starmap(mixed_sqlite_worker, [
+            (user, product_ids, brand_names, operations, seed * 1000 + user.pk, reuse_connections)
+            for user in users
+        ]):
+            samples[label].extend(entries)
+    return summarize(samples, time.perf_counter() - start)
+
+
+@scenario('sqlite')
+def sqlite_tuning(options):
+    """Concurrent catalog reads and cart writes on stock SQLite settings against the tuned ones."""
+    threads, operations = max(options['threads'], 2), options['operations']
+    products = options['products'] or 20000
+    seed_catalog(products, seed=options['seed'], users=threads)
+    users = list(User.objects.all()[:threads])
+    product_ids = list(Product.objects.values_list('pk', flat=True)[:5000])
+    brand_names = list(Brand.objects.values_list('name', flat=True))
+    tuned_options = connection.settings_dict['OPTIONS']
+    configurations = (
+        # The Django defaults: rollback journal, one connection per request, no router.
+        ('stock', {}, [], False),
+        ('tuned', tuned_options, settings.DATABASE_ROUTERS, True),
+    )
+    request_logger = logging.getLogger('django.request')
+    previous_level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    results = {}
+    try:
+        for name, db_options, routers, reuse in configurations:
+            connections.close_all()
+            connection.settings_dict['OPTIONS'] = db_options
+            with connection.cursor() as cursor:
+                # The journal mode is stored in the database file.
+                cursor.execute(f"PRAGMA journal_mode={'WAL' if db_options else 'DELETE'}")
+            with override_settings(DATABASE_ROUTERS=routers, CACHES=NO_CATALOG_CACHE):
+                results[name] = drive_mixed_sqlite_load(
+                    users, product_ids, brand_names, operations, options['seed'], reuse,
+                )
+    finally:
+        request_logger.setLevel(previous_level)
+        connections.close_all()
+        connection.settings_dict['OPTIONS'] = tuned_options
+    return {'products': products, 'workers': threads, 'requests_per_worker': operations, 'results': results}
+
+
+@scenario('auth')
+def authentication(options):
+    """Queries and latency per GET /api/cart/ with database or cached sessions and users, and signed tokens."""
+    seed_catalog(1000, seed=options['seed'], users=options['users'], carts=options['users'])
+    users = list(User.objects.all()[:options['users']])
+    configurations = (
+        # The Django defaults: sessions and users read from the database.
+        ('db_session', {
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+            'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+        }, False),
+        # The project default without a shared cache: database sessions, cached users.
+        ('cached_user', {'SESSION_ENGINE': 'django.contrib.sessions.backends.db'}, False),
+        ('cached_session', {'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db'}, False),
+        ('token', {}, True),
+    )
+    results = {}
+    for name, overrides, token in configurations:
+        # No router, so every query runs on, and is counted on, one connection.
+        with override_settings(DATABASE_ROUTERS=[], **overrides):
+            cache.clear()
+            clients = []
+            for user in users:
+                client = Client()
+                if token:
+                    client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {issue_token(user)}'
+                else:
+                    client.force_login(user)
+                client.get('/api/cart/')  # Warms the caches.
+                clients.append(client)
+            latencies, queries = [], []
+            for index in range(options['operations']):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = clients[index % len(clients)].get('/api/cart/')
+                    latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.status_code
+                queries.append(len(ctx.captured_queries))
+        latencies.sort()
+        results[name] = {
+            'queries_per_request': round(statistics.fmean(queries), 2),
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+        }
+    return {'users': len(users), 'requests': options['operations'], 'results': results}
+
+
+# Run in a fresh interpreter per sample: import the WSGI application, then
+# serve one request that needs no database (the loopback-only metrics view).
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from ecommerce_practice.wsgi import application
+loaded = time.perf_counter()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/metrics/', 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1', 'wsgi.url_scheme': 'http',
+    'wsgi.input': sys.stdin.buffer, 'wsgi.errors': sys.stderr,
+}
+b''.join(application(environ, lambda code, headers: status.append(code)))
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (loaded - start) * 1000, 'first_request_ms': (done - loaded) * 1000,
+    'modules': len(sys.modules), 'status': status[0],
+}))
+"""
+
+
+@scenario('startup')
+def startup(options):
+    """Cold start of a WSGI worker on the full settings against the API-only profile."""
+    results = {}
+    for name, settings_module in (
+        ('full', 'ecommerce_practice.settings'),
+        ('api_only', 'ecommerce_practice.settings_api'),
+    ):
+        environ = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        for variable in ('API_PROFILE_IMPORTS', 'API_PROFILE_REQUESTS'):
+            environ.pop(variable, None)
+        runs = []
+        for _ in range(options['repeat']):
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT], env=environ, cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(json.loads(output.splitlines()[-1]))
+        assert all(run['status'].startswith('200') for run in runs), runs
+        results[name] = {
+            'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+            'first_request_ms': round(statistics.median(run['first_request_ms'] for run in runs), 1),
+            'modules': runs[-1]['modules'],
+        }
+    return {'samples': options['repeat'], 'results': results}
+
+
+def compare(baseline, results):
+    """Per-endpoint changes between two `api` benchmark reports."""
+    lines = []
+    for label, current in results.get('endpoints', {}).items():
+        previous = baseline.get('endpoints', {}).get(label)
+        if previous is None:
+            lines.append(f'{label}: new endpoint')
+            continue
+        changes = []
+        for name, before, after in [
+            ('p50', previous['latency_ms']['p50'], current['latency_ms']['p50']),
+            ('p95', previous['latency_ms']['p95'], current['latency_ms']['p95']),
+            ('queries', previous['queries_mean'], current['queries_mean']),
+        ]:
+            if before is None or after is None:
+                continue
+            delta = f'{(after - before) / before:+.1%}' if before else 'n/a'
+            changes.append(f'{name} {before} -> {after} ({delta})')
+        lines.append(f"{label}: {', '.join(changes)}")
+    return lines
@@ -0,0 +1,125 @@
+"""
+Read-through response cache for catalog endpoints.
+
+Entries are keyed by a catalog generation number plus the normalized
+request parameters. Product and Brand writes bump the generation once
+their transaction commits (see api.signals), which orphans every cached
+response at once; orphaned entries age out through the backend's LRU
+eviction.
+
+The time of the last catalog write is kept next to the generation for
+Last-Modified headers. When it is missing (a cold or restarted cache) it
+is read back from the products' and brands' `updated_at`, so it never
+falls back to the time the process started.
+
+In production the catalog alias is shared by every process (see
+CACHES in settings). A per-process cache (LocMemCache) only sees the
+writes its own process makes, so there the generation expires with the
+cached responses: other processes' writes show up within the alias's
+TIMEOUT rather than never.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Max, Subquery
+from django.utils.http import urlencode
+
+from .models import Brand, Product
+
+CATALOG_CACHE = 'catalog'
+GENERATION_KEY = 'catalog:generation'
+MODIFIED_KEY = 'catalog:modified'
+
+
+def get_catalog_cache():
+    return caches[CATALOG_CACHE]
+
+
+def generation_timeout(cache):
+    return cache.default_timeout if isinstance(cache, LocMemCache) else None
+
+
+def get_generation():
+    cache = get_catalog_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so a lost or evicted counter never reuses an
+        # old generation.
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=generation_timeout(cache))
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation(modified=None):
+    """Invalidates cached catalog responses after a write made at Unix time `modified` (default: now)."""
+    cache = get_catalog_cache()
+    timeout = generation_timeout(cache)
+    try:
+        # Atomic on shared backends, so concurrent writers never lose a bump.
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=timeout)
+    # Racing writers may leave the older of two close write times; that only
+    # makes Last-Modified earlier than it could be, never stale.
+    modified = time.time() if modified is None else modified
+    cache.set(MODIFIED_KEY, max(modified, cache.get(MODIFIED_KEY) or 0), timeout=timeout)
+
+def latest_write_query():
+    # Newest brand and newest product in one query; products can only
+    # exist while some brand does.
+    newest_product = Product.objects.order_by('-updated_at').values('updated_at')[:1]
+    return Brand.objects.all(), {
+        'brand': Max('updated_at'),
+        'product': Max(Subquery(newest_product)),
+    }
+
+
+def latest_write_time(latest):
+    times = [value.timestamp() for value in latest.values() if value is not None]
+    return max(times) if times else time.time()
+
+
+def persisted_last_modified():
+    """Unix time of the newest product or brand row, or now for an empty catalog."""
+    queryset, aggregates = latest_write_query()
+    return latest_write_time(queryset.aggregate(**aggregates))
+
+
+async def apersisted_last_modified():
+    queryset, aggregates = latest_write_query()
+    return latest_write_time(await queryset.aaggregate(**aggregates))
+
+
+def get_last_modified():
+    """Unix time of the last catalog write, for Last-Modified headers."""
+    cache = get_catalog_cache()
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        modified = persisted_last_modified()
+        cache.add(MODIFIED_KEY, modified, timeout=generation_timeout(cache))
+    return modified
+
+
+async def aget_last_modified():
+    cache = get_catalog_cache()
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        modified = await apersisted_last_modified()
+        cache.add(MODIFIED_KEY, modified, timeout=generation_timeout(cache))
+    return modified
+
+def normalize_params(query_params, names):
+    params = []
+    for name in names:
+        value = query_params.get(name)
+        if value:
+            params.append((name, value.lower() if name == 'brand' else value))
+    return urlencode(params)
+
+
+def response_cache_key(prefix, host, query_params=None, names=()):
+    params = normalize_params(query_params, names) if query_params else ''
+    digest = hashlib.md5(f'{host}?{params}'.encode()).hexdigest()
+    return f'catalog:{get_generation()}:{prefix}:{digest}'
@@ -0,0 +1,444 @@
+"""
+Pluggable cart storage used by the cart views.
+
+CART_STORE names the backend class and CART_STORE_OPTIONS its keyword
+arguments. Every backend returns carts in the CartSerializer format, except
+that WriteBehindCartStore leaves out item ids: it only learns them when a
+cart is flushed, and an id that appears later would not be consistent.
+
+DatabaseCartStore (the default) reads and writes Cart/CartItem on every
+call. WriteBehindCartStore keeps hot carts in process memory, sharded by
+user id so users on different shards never wait on each other, and
+persists changed carts in batches from a background thread: every
+`flush_interval` seconds, as soon as `max_dirty` carts are waiting, and
+at interpreter exit. Its carts live in one process, so run it with a
+single worker process (threads or ASGI) or route each user to the same
+worker. Database reads happen outside the shard locks.
+"""
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import get_generation
+from .fast_serializers import cart_rows, datetime_to_string, product_rows
+from .models import Cart, CartItem, Product
+from .serializers import CartSerializer
+
+logger = logging.getLogger('api.cart_store')
+
+
+class DatabaseCartStore:
+    def data(self, cart):
+        if settings.API_FAST_SERIALIZERS:
+            return cart_rows.data(Cart.objects.get(pk=cart.pk))
+        return CartSerializer(Cart.objects.with_items().get(pk=cart.pk)).data
+
+    def get(self, user):
+        if settings.API_FAST_SERIALIZERS:
+            cart, _ = Cart.objects.get_or_create(user=user)
+            return cart_rows.data(cart)
+        cart, _ = Cart.objects.with_items().get_or_create(user=user)
+        return CartSerializer(cart).data
+
+    def add(self, user, product, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        cart.add_product(product, quantity)
+        return self.data(cart)
+
+    def add_many(self, user, quantities):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        cart.add_products(quantities)
+        return self.data(cart)
+
+    def version(self, user):
+        """The (id, version, updated_at) of the user's cart, or None if there is none."""
+        return Cart.objects.filter(user=user).values_list('pk', 'version', 'updated_at').first()
+
+    def clear(self, user):
+        """Empties the user's cart; False when the user has none."""
+        cart = Cart.objects.filter(user=user).first()
+        if cart is None:
+            return False
+        cart.clear()
+        return True
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        pass
+
+    # Async variants for the ASGI views, on the async ORM where it can.
+
+    async def aget(self, user):
+        cart, created = await Cart.objects.with_items().aget_or_create(user=user)
+        if created:
+            cart = await Cart.objects.with_items().aget(pk=cart.pk)
+        return CartSerializer(cart).data
+
+    async def aversion(self, user):
+        return await Cart.objects.filter(user=user).values_list('pk', 'version', 'updated_at').afirst()
+
+    async def aadd(self, user, product, quantity):
+        cart, _ = await Cart.objects.aget_or_create(user=user)
+        await cart.aadd_product(product, quantity)
+        return CartSerializer(await Cart.objects.with_items().aget(pk=cart.pk)).data
+
+    async def aclear(self, user):
+        cart = await Cart.objects.filter(user=user).afirst()
+        if cart is None:
+            return False
+        await sync_to_async(cart.clear)()
+        return True
+
+
+class CartState:
+    __slots__ = (
+        'cart_id', 'user_id', 'created_at', 'version', 'updated_at', 'items', 'dirty', 'pruned', 'flushing',
+    )
+
+    def __init__(self, cart_id, user_id, created_at, version, updated_at, items):
+        self.cart_id = cart_id
+        self.user_id = user_id
+        self.created_at = created_at
+        self.version = version
+        self.updated_at = updated_at
+        # product id -> quantity, in item order.
+        self.items = items
+        self.dirty = False
+        # Items were removed, so the flush must delete rows as well.
+        self.pruned = False
+        # A flush is writing this cart; it must not be evicted and reloaded meanwhile.
+        self.flushing = False
+
+
+class Shard:
+    __slots__ = ('lock', 'carts', 'dirty', 'evictions')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # user id -> CartState, least recently used first.
+        self.carts = OrderedDict()
+        self.dirty = 0
+        # Bumped on every eviction, so a cart loaded without the lock held
+        # is only cached if no eviction (and flush) happened meanwhile.
+        self.evictions = 0
+
+
+class WriteBehindCartStore:
+    def __init__(
+        self, shards=16, flush_interval=1.0, max_dirty=1000, max_carts=100000, flush_batch=500, max_products=10000,
+    ):
+        self.shards = [Shard() for _ in range(shards)]
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.max_carts_per_shard = max(max_carts // shards, 1)
+        self.flush_batch = flush_batch
+        self.flush_lock = threading.Lock()
+        # product id -> (catalog generation, representation, price), least
+        # recently used first.
+        self.products = OrderedDict()
+        self.products_lock = threading.Lock()
+        self.max_products = max_products
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.failed_flushes = 0
+        self.start_lock = threading.Lock()
+        self.flushes_at_exit = False
+
+    @property
+    def dirty(self):
+        return sum(shard.dirty for shard in self.shards)
+
+    def shard(self, user_id):
+        return self.shards[user_id % len(self.shards)]
+
+    def load(self, user):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        rows = CartItem.objects.filter(cart=cart).order_by('pk').values_list('product_id', 'quantity')
+        return CartState(cart.pk, user.pk, cart.created_at, cart.version, cart.updated_at, dict(rows))
+
+    @contextmanager
+    def locked(self, user):
+        """Yields the user's shard and cart state with the shard lock held, loading the cart on a miss."""
+        shard = self.shard(user.pk)
+        loaded = None
+        while True:
+            with shard.lock:
+                state = shard.carts.get(user.pk)
+                if state is None and loaded is not None and loaded[0] == shard.evictions:
+                    state = shard.carts[user.pk] = loaded[1]
+                    self.evict(shard)
+                if state is not None:
+                    shard.carts.move_to_end(user.pk)
+                    yield shard, state
+                    return
+                evictions = shard.evictions
+            loaded = evictions, self.load(user)
+
+    def evict(self, shard):
+        # Drop the least recently used carts that have nothing left to write.
+        excess = len(shard.carts) - self.max_carts_per_shard
+        for user_id in list(shard.carts)[:max(excess, 0)]:
+            state = shard.carts[user_id]
+            if not state.dirty and not state.flushing:
+                del shard.carts[user_id]
+                shard.evictions += 1
+
+    def changed(self, shard, state):
+        state.version += 1
+        state.updated_at = timezone.now()
+        self.mark_dirty(shard, state)
+
+    def mark_dirty(self, shard, state):
+        if not state.dirty:
+            state.dirty = True
+            shard.dirty += 1
+
+    def get(self, user):
+        with self.locked(user) as (_, state):
+            snapshot = self.snapshot(state)
+        return self.render(snapshot)
+
+    def version(self, user):
+        with self.locked(user) as (_, state):
+            return state.cart_id, state.version, state.updated_at
+
+    def add(self, user, product, quantity):
+        return self.add_many(user, {product.pk: quantity})
+
+    def add_many(self, user, quantities):
+        with self.locked(user) as (shard, state):
+            for product_id, quantity in quantities.items():
+                state.items[product_id] = state.items.get(product_id, 0) + quantity
+            self.changed(shard, state)
+            snapshot = self.snapshot(state)
+        self.dirtied()
+        return self.render(snapshot)
+
+    def clear(self, user):
+        """Empties the user's cart; False when the user has none."""
+        shard = self.shard(user.pk)
+        with shard.lock:
+            cached = user.pk in shard.carts
+        if not cached and not Cart.objects.filter(user=user).exists():
+            return False
+        with self.locked(user) as (shard, state):
+            if state.items:
+                state.items.clear()
+                state.pruned = True
+                self.changed(shard, state)
+        self.dirtied()
+        return True
+
+    def flush(self):
+        """Writes every changed cart to the database; returns how many."""
+        with self.flush_lock:
+            batch = []
+            for shard in self.shards:
+                with shard.lock:
+                    for state in shard.carts.values():
+                        if state.dirty:
+                            batch.append((state, state.pruned, dict(state.items), state.version, state.updated_at))
+                            state.dirty = state.pruned = False
+                            state.flushing = True
+                    shard.dirty = 0
+            for start in range(0, len(batch), self.flush_batch):
+                chunk = batch[start:start + self.flush_batch]
+                try:
+                    self.write(chunk)
+                except Exception:
+                    # Whatever was not committed stays dirty for the next flush.
+                    self.restore(batch[start:])
+                    raise
+                self.written(chunk)
+            return len(batch)
+
+    def write(self, chunk):
+        cart_ids = [state.cart_id for state, *_ in chunk]
+        product_ids = {product_id for _, _, items, *_ in chunk for product_id in items}
+        with transaction.atomic():
+            existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+            for state, pruned, items, *_ in chunk:
+                if pruned:
+                    CartItem.objects.filter(cart_id=state.cart_id).exclude(product_id__in=items).delete()
+            # Quantities are absolute, so writing a cart twice is harmless.
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart_id=state.cart_id, product_id=product_id, quantity=quantity)
+                    for state, _, items, *_ in chunk
+                    for product_id, quantity in items.items()
+                    if product_id in existing
+                ],
+                update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity'],
+            )
+            Cart.objects.filter(pk__in=cart_ids).recompute_totals()
+            # The versions the in-memory carts were served at, for their ETags.
+            Cart.objects.bulk_update(
+                [
+                    Cart(pk=state.cart_id, version=version, updated_at=updated_at)
+                    for state, _, _, version, updated_at in chunk
+                ],
+                ['version', 'updated_at'],
+            )
+
+    def written(self, chunk):
+        for state, *_ in chunk:
+            shard = self.shard(state.user_id)
+            with shard.lock:
+                state.flushing = False
+
+    def restore(self, batch):
+        for state, pruned, *_ in batch:
+            shard = self.shard(state.user_id)
+            with shard.lock:
+                state.flushing = False
+                state.pruned = state.pruned or pruned
+                self.mark_dirty(shard, state)
+
+    def dirtied(self):
+        self.flush_at_exit()
+        if self.flush_interval is None:
+            # No background writer: flush inline once enough carts are waiting.
+            if self.dirty >= self.max_dirty:
+                self.flush()
+            return
+        self.start()
+        if self.dirty >= self.max_dirty:
+            self.wake.set()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='cart-store-writer', daemon=True)
+                self.thread.start()
+
+    def flush_at_exit(self):
+        # With or without the background writer, so no dirty cart is lost on shutdown.
+        if self.flushes_at_exit:
+            return
+        with self.start_lock:
+            if not self.flushes_at_exit:
+                atexit.register(self.close)
+                self.flushes_at_exit = True
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                self.wake.wait(self.flush_interval)
+                self.wake.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    self.failed_flushes += 1
+                    logger.exception('Cart flush failed; retrying on the next interval')
+        finally:
+            connections.close_all()
+
+    def close(self):
+        """Stops the background writer and flushes what is left."""
+        atexit.unregister(self.close)
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+
+    def snapshot(self, state):
+        return state, list(state.items.items())
+
+    def product_data(self, product_ids):
+        """Representation and price per product id, reloaded when the catalog changes."""
+        generation = get_generation()
+        found = {}
+        with self.products_lock:
+            for pk in product_ids:
+                entry = self.products.get(pk)
+                if entry is not None and entry[0] == generation:
+                    self.products.move_to_end(pk)
+                    found[pk] = entry
+        stale = [pk for pk in product_ids if pk not in found]
+        if not stale:
+            return found
+        price = product_rows.index['price']
+        loaded = {
+            row[0]: (generation, product_rows.to_representation(row), row[price])
+            for row in product_rows.rows(Product.objects.filter(pk__in=stale))
+        }
+        found.update(loaded)
+        with self.products_lock:
+            # Deleted products are dropped from the cart like the cascade drops their items.
+            for pk in stale:
+                self.products.pop(pk, None)
+            self.products.update(loaded)
+            while len(self.products) > self.max_products:
+                self.products.popitem(last=False)
+        return found
+
+    def render(self, snapshot):
+        state, items = snapshot
+        products = self.product_data([product_id for product_id, _ in items])
+        rendered, item_count, subtotal = [], 0, Decimal('0.00')
+        for product_id, quantity in items:
+            if product_id not in products:
+                continue
+            _, representation, price = products[product_id]
+            rendered.append({'product': representation, 'quantity': quantity})
+            item_count += quantity
+            subtotal += price * quantity
+        return {
+            'id': state.cart_id,
+            'user': state.user_id,
+            'created_at': datetime_to_string(state.created_at),
+            'items': rendered,
+            'item_count': item_count,
+            'total_value': subtotal,
+        }
+
+    async def aget(self, user):
+        return await sync_to_async(self.get)(user)
+
+    async def aversion(self, user):
+        return await sync_to_async(self.version)(user)
+
+    async def aadd(self, user, product, quantity):
+        return await sync_to_async(self.add)(user, product, quantity)
+
+    async def aclear(self, user):
+        return await sync_to_async(self.clear)(user)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store_class = import_string(settings.CART_STORE)
+                _store = store_class(**settings.CART_STORE_OPTIONS)
+    return _store
+
+
+@receiver(setting_changed)
+def reset_cart_store(setting, **kwargs):
+    global _store
+    if setting in ('CART_STORE', 'CART_STORE_OPTIONS') and _store is not None:
+        _store.close()
+        _store = None
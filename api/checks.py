@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+from .cache import CATALOG_CACHE
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """Warns when a cache that has to be shared between processes is per-process."""
+    return [
+        Warning(
+            f"The '{alias}' cache is local to each process.",
+            hint=(
+                'Catalog invalidations, logouts and token revocations only reach the '
+                'process that made them. Set API_REDIS_URL to share the cache.'
+            ),
+            id='api.W001',
+        )
+        for alias in (DEFAULT_CACHE_ALIAS, CATALOG_CACHE)
+        if alias in settings.CACHES and isinstance(caches[alias], LocMemCache)
+    ]
+
+
+@register(Tags.security, deploy=True)
+def check_metrics_token(app_configs, **kwargs):
+    """Warns when the metrics endpoint is only guarded by the client address."""
+    if settings.API_METRICS_TOKEN:
+        return []
+    return [
+        Warning(
+            'API_METRICS_TOKEN is not set.',
+            hint=(
+                '/api/metrics/ then trusts loopback clients, and behind a reverse proxy on '
+                'the same host every request is one. Set API_METRICS_TOKEN to require a token.'
+            ),
+            id='api.W002',
+        )
+    ]
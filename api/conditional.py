@@ -0,0 +1,71 @@
+"""
+Conditional GET (ETag / Last-Modified) for catalog and cart responses.
+
+Validators come from version counters, never from the rendered body, so a
+304 costs no queryset evaluation or serialization:
+
+- catalog responses: the catalog generation (api.cache) and the
+  normalized request parameters, and the time of the last catalog write.
+- carts: the cart's id, `version` and `updated_at`, plus the catalog
+  generation, since cart items embed products.
+
+The async views use the a-prefixed variants, which may query the
+database when the last write time is not cached.
+"""
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import aget_last_modified, get_generation, get_last_modified
+
+
+def catalog_etag(cache_key, format):
+    return quote_etag(f"{cache_key.removeprefix('catalog:')}:{format}")
+
+
+def catalog_validators(cache_key, format='json'):
+    """(ETag, Last-Modified) for a catalog response cached under `cache_key`."""
+    return catalog_etag(cache_key, format), get_last_modified()
+
+
+async def acatalog_validators(cache_key, format='json'):
+    return catalog_etag(cache_key, format), await aget_last_modified()
+
+
+def cart_validators(state, format='json'):
+    """
+    (ETag, Last-Modified) for a cart whose (id, version, updated_at) is
+    `state`, or None if the user has no cart yet.
+    """
+    if state is None:
+        return None
+    return cart_etag(state, format), max(state[2].timestamp(), get_last_modified())
+
+
+async def acart_validators(state, format='json'):
+    if state is None:
+        return None
+    return cart_etag(state, format), max(state[2].timestamp(), await aget_last_modified())
+
+
+def cart_etag(state, format):
+    cart_id, version, _ = state
+    return quote_etag(f'cart:{cart_id}:{version}:{get_generation()}:{format}')
+
+
+def not_modified(request, validators):
+    """The 304 (or 412) response for `request` if `validators` satisfy its conditions, else None."""
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is not None:
+        set_validators(response, validators)
+    return response
+
+
+def set_validators(response, validators):
+    if validators is not None and response.status_code in (200, 304):
+        etag, last_modified = validators
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,81 @@
+"""
+Streaming catalog export.
+
+Rows are read with `.values()` and `iterator(chunk_size=...)`, so no model
+instances are built and at most one chunk of rows is held at a time.
+Encoded output is yielded in buffered pieces, optionally gzip-compressed,
+which keeps memory flat however large the catalog is. Each record has the
+same fields and values as ProductSerializer.
+"""
+import json
+import zlib
+
+from .fast_serializers import decimal_to_string
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+CHUNK_SIZE = 2000
+# Bytes buffered before a piece is handed to the response or file.
+WRITE_SIZE = 64 * 1024
+
+FIELDS = ('id', 'name', 'description', 'price', 'brand__name', 'category', 'gender')
+
+
+def export_records(queryset, chunk_size=CHUNK_SIZE):
+    rows = queryset.order_by('pk').values_list(*FIELDS).iterator(chunk_size=chunk_size)
+    for pk, name, description, price, brand, category, gender in rows:
+        yield {
+            'id': pk,
+            'name': name,
+            'description': description,
+            # DRF renders decimals as strings by default.
+            'price': decimal_to_string(price),
+            'brand': brand,
+            'category': category,
+            'gender': gender,
+        }
+
+
+def encode(records, format='ndjson'):
+    """Yields the text of `records` as NDJSON lines or one JSON array."""
+    if format == 'ndjson':
+        for record in records:
+            yield json.dumps(record) + '\n'
+        return
+    yield '['
+    separator = '\n'
+    for record in records:
+        yield separator + json.dumps(record)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def buffered(pieces, size=WRITE_SIZE):
+    """Joins small text pieces into encoded chunks of roughly `size` bytes."""
+    buffer, length = [], 0
+    for piece in pieces:
+        data = piece.encode()
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(queryset, format='ndjson', compress=False, chunk_size=CHUNK_SIZE):
+    """Yields the export of `queryset` as byte chunks."""
+    chunks = buffered(encode(export_records(queryset, chunk_size), format))
+    return gzipped(chunks) if compress else chunks
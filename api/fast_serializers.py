@@ -0,0 +1,120 @@
+"""
+Lightweight serializers for hot read paths.
+
+DRF's ModelSerializer builds model instances and walks a list of bound
+fields for every object. These row serializers instead read the needed
+columns with `values_list()` and turn each row into a dict with a function
+built once per serializer. Their JSON output is byte-for-byte the same
+as the DRF serializers they shadow (ProductSerializer, BrandSerializer,
+CartSerializer). They are read-only; writes and validation still go
+through DRF. Views use them when API_FAST_SERIALIZERS is enabled.
+"""
+from rest_framework import serializers
+
+from .metrics import timer
+from .models import CartItem
+
+# The database converter already quantizes decimals to the field's
+# decimal_places, so formatting matches DecimalField.to_representation.
+# Shared with api.export so every endpoint renders prices alike.
+decimal_to_string = '{:f}'.format
+datetime_to_string = serializers.DateTimeField().to_representation
+
+
+class RowSerializer:
+    """
+    Serializes `values_list()` rows. `fields` is a sequence of
+    (output key, lookup, converter or None) in output order.
+    """
+    fields = ()
+
+    def __init__(self):
+        self.lookups = [lookup for _, lookup, _ in self.fields]
+        self.index = {lookup: i for i, lookup in enumerate(self.lookups)}
+        self.to_representation = self.compile()
+
+    def compile(self):
+        # Zipping keys with the row builds the dict in one C-level call;
+        # only fields with a converter are revisited.
+        keys = tuple(key for key, _, _ in self.fields)
+        converters = tuple(
+            (key, i, converter) for i, (key, _, converter) in enumerate(self.fields) if converter is not None
+        )
+
+        def to_representation(row):
+            data = dict(zip(keys, row))
+            for key, i, converter in converters:
+                data[key] = converter(row[i])
+            return data
+        return to_representation
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.lookups)
+
+    def serialize(self, rows):
+        with timer('serializer'):
+            return [self.to_representation(row) for row in rows]
+
+    def data(self, queryset):
+        return self.serialize(self.rows(queryset))
+
+
+class ProductRowSerializer(RowSerializer):
+    fields = (
+        ('id', 'id', None),
+        ('name', 'name', None),
+        ('description', 'description', None),
+        ('price', 'price', decimal_to_string),
+        ('brand', 'brand__name', None),
+        ('category', 'category', None),
+        ('gender', 'gender', None),
+    )
+
+    def position(self, row):
+        """The keyset pagination position of a raw row."""
+        return row[self.index['price']], row[self.index['id']]
+
+
+class BrandRowSerializer(RowSerializer):
+    fields = (
+        ('id', 'id', None),
+        ('name', 'name', None),
+    )
+
+
+class CartItemRowSerializer(RowSerializer):
+    fields = (('id', 'id', None),) + tuple(
+        (key, f'product__{lookup}', converter) for key, lookup, converter in ProductRowSerializer.fields
+    ) + (('quantity', 'quantity', None),)
+
+    def compile(self):
+        product = ProductRowSerializer().to_representation
+        width = len(ProductRowSerializer.fields)
+
+        def to_representation(row):
+            return {'id': row[0], 'product': product(row[1:width + 1]), 'quantity': row[-1]}
+        return to_representation
+
+
+class CartRowSerializer:
+    """Serializes a cart with two queries: the cart row and its item rows."""
+
+    def __init__(self):
+        self.items = CartItemRowSerializer()
+
+    def data(self, cart):
+        rows = list(self.items.rows(CartItem.objects.filter(cart=cart).order_by('pk')))
+        with timer('serializer'):
+            return {
+                'id': cart.pk,
+                'user': cart.user_id,
+                'created_at': datetime_to_string(cart.created_at),
+                'items': [self.items.to_representation(row) for row in rows],
+                'item_count': cart.item_count,
+                'total_value': cart.total_value,
+            }
+
+
+product_rows = ProductRowSerializer()
+brand_rows = BrandRowSerializer()
+cart_rows = CartRowSerializer()
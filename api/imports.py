@@ -0,0 +1,208 @@
+"""
+Bulk catalog import.
+
+Input is parsed as a stream, so a file of any size is held one chunk at a
+time. Each chunk is validated with plain Python checks, its brands are
+resolved against an in-memory name map that grows as new brands are created,
+and its products are upserted by id with a single bulk_create in one
+transaction. Rows without an id are inserted. The input has the same fields as
+the catalog export (api.export), so an export can be imported again.
+
+bulk_create() bypasses model signals. The stored totals of carts holding an
+upserted product are recomputed in the chunk's transaction; the summaries
+and the catalog cache are brought up to date once, by `finish_import`.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .cache import bump_generation
+from .models import Brand, Cart, PriceBucket, Product, ProductFacet
+
+FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 5000
+# Rejected rows reported individually; the rest are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+CATEGORIES = frozenset(key for key, _ in Product.CATEGORY_CHOICES)
+GENDERS = frozenset(key for key, _ in Product.GENDER_CHOICES)
+NAME_MAX_LENGTH = Product._meta.get_field('name').max_length
+BRAND_MAX_LENGTH = Brand._meta.get_field('name').max_length
+PRICE_LIMIT = Decimal(10) ** 8  # max_digits=10 with decimal_places=2
+UPDATE_FIELDS = ['name', 'description', 'price', 'brand', 'category', 'gender', 'updated_at']
+
+
+def parse_csv(lines):
+    for line, row in enumerate(csv.DictReader(lines), start=2):
+        yield line, row
+
+
+def parse_ndjson(lines):
+    for line, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, None
+            continue
+        yield line, row
+
+
+PARSERS = {'csv': parse_csv, 'ndjson': parse_ndjson}
+
+
+def clean_row(row):
+    """Returns the product values of `row`, or raises ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError('Row is not a JSON object.')
+    pk = row.get('id')
+    if pk in (None, ''):
+        pk = None
+    else:
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid id "{pk}".')
+        if pk < 1:
+            raise ValueError(f'Invalid id "{pk}".')
+
+    name = str(row.get('name') or '').strip()
+    if not name or len(name) > NAME_MAX_LENGTH:
+        raise ValueError(f'name must be 1 to {NAME_MAX_LENGTH} characters.')
+    brand = str(row.get('brand') or '').strip()
+    if not brand or len(brand) > BRAND_MAX_LENGTH:
+        raise ValueError(f'brand must be 1 to {BRAND_MAX_LENGTH} characters.')
+
+    try:
+        price = Decimal(str(row.get('price')))
+        if not price.is_finite() or not 0 <= price < PRICE_LIMIT:
+            raise InvalidOperation
+        price = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"Invalid price \"{row.get('price')}\".")
+
+    category = row.get('category')
+    if not isinstance(category, str) or category not in CATEGORIES:
+        raise ValueError(f'"{category}" is not a valid category.')
+    gender = row.get('gender') or 'Unisex'
+    if not isinstance(gender, str) or gender not in GENDERS:
+        raise ValueError(f'"{gender}" is not a valid gender.')
+
+    return {
+        'id': pk,
+        'name': name,
+        'description': str(row.get('description') or ''),
+        'price': price,
+        'brand': brand,
+        'category': category,
+        'gender': gender,
+    }
+
+
+class CatalogImport:
+    """Imports rows chunk by chunk and tallies the results."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.elapsed = 0.0
+        # Brand names are matched case-insensitively, like the `brand` filter.
+        self.brands = {name.lower(): pk for pk, name in Brand.objects.values_list('pk', 'name')}
+
+    def run(self, rows):
+        """Imports `rows`, an iterable of (line number, row) pairs."""
+        start = time.perf_counter()
+        chunk = []
+        try:
+            for line, row in rows:
+                try:
+                    chunk.append(clean_row(row))
+                except ValueError as error:
+                    self.reject(line, str(error))
+                    continue
+                if len(chunk) >= self.chunk_size:
+                    self.write(chunk)
+                    chunk = []
+            if chunk:
+                self.write(chunk)
+        finally:
+            self.elapsed += time.perf_counter() - start
+        return self
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': error})
+
+    def resolve_brands(self, names):
+        missing = {}
+        for name in names:
+            if name.lower() not in self.brands:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            Brand.objects.bulk_create([Brand(name=name) for name in missing.values()], ignore_conflicts=True)
+            created = Brand.objects.filter(name__in=missing.values()).values_list('pk', 'name')
+            self.brands.update((name.lower(), pk) for pk, name in created)
+
+    def write(self, chunk):
+        # Later rows for the same id win, as they would row by row.
+        by_id, new = {}, []
+        for values in chunk:
+            if values['id'] is None:
+                new.append(values)
+            else:
+                by_id[values['id']] = values
+        rows = list(by_id.values()) + new
+        with transaction.atomic():
+            self.resolve_brands({values['brand'] for values in rows})
+            products = [
+                Product(brand_id=self.brands[values.pop('brand').lower()], **values)
+                for values in rows
+            ]
+            Product.objects.bulk_create(
+                products, batch_size=self.chunk_size,
+                update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS,
+            )
+            # Rows without an id are new products, which no cart holds yet.
+            if by_id:
+                Cart.objects.holding(by_id).recompute_totals()
+        self.imported += len(chunk)
+
+    @property
+    def rows_per_sec(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        return {
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'elapsed_s': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+def finish_import():
+    """Brings the summaries and caches that bulk_create() skipped up to date."""
+    ProductFacet.objects.rebuild()
+    PriceBucket.objects.rebuild()
+    bump_generation()
+
+
+def import_catalog(lines, format, chunk_size=CHUNK_SIZE):
+    """Imports text `lines` in `format` and returns the finished CatalogImport."""
+    result = CatalogImport(chunk_size)
+    try:
+        result.run(PARSERS[format](lines))
+    finally:
+        # Chunks written before an undecodable or malformed line are
+        # committed, so they are finished even when the import fails.
+        if result.imported:
+            finish_import()
+    return result
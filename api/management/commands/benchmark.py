@@ -0,0 +1,44 @@
+from contextlib import nullcontext
+import json
+
+from django.core.management.base import BaseCommand
+from api.benchmarks import SCENARIOS, benchmark_database, compare
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark scenario against a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--products', type=int, help='Catalog size to seed')
+        parser.add_argument('--users', type=int, default=50, help='Users to seed and drive')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests in the mixed workload')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and workload')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent workers')
+        parser.add_argument('--operations', type=int, default=200, help='Operations per worker')
+        parser.add_argument('--repeat', type=int, default=5, help='Samples per measurement')
+        parser.add_argument(
+            '--base-url',
+            help='Drive a running server (e.g. http://127.0.0.1:8000) instead of the in-process test client',
+        )
+        parser.add_argument('--auth', help='username:password for cart requests against --base-url')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+        parser.add_argument('--compare', help='Baseline JSON file to diff the results against')
+
+    def handle(self, *args, **options):
+        # A live server brings its own data, so there is nothing to seed.
+        database = nullcontext() if options['base_url'] else benchmark_database()
+        with database:
+            results = SCENARIOS[options['scenario']](options)
+
+        report = json.dumps(results, indent=2)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            for line in compare(baseline, results):
+                self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f"Finished {options['scenario']} benchmark"))
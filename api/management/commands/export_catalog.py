@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from api.export import CHUNK_SIZE, FORMATS, export_catalog
+from api.models import Product
+from api.views import filter_products
+
+
+class Command(BaseCommand):
+    help = 'Stream the product catalog as NDJSON or a JSON array'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson', help='Output format')
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per database round trip')
+        parser.add_argument('--category', help='Only export this category')
+        parser.add_argument('--gender', help='Only export this gender')
+        parser.add_argument('--brand', help='Only export this brand')
+
+    def handle(self, *args, **options):
+        queryset = filter_products(Product.objects.all(), options)
+        chunks = export_catalog(queryset, options['format'], options['gzip'], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported catalog to {options['output']} ({written:,} bytes)"))
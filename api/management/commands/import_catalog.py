@@ -0,0 +1,40 @@
+import gzip
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from api.imports import CHUNK_SIZE, FORMATS, import_catalog
+
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class Command(BaseCommand):
+    help = 'Upsert products from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import; '-' reads stdin. A .gz suffix is decompressed")
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or EXTENSIONS.get(os.path.splitext(path.removesuffix('.gz'))[1])
+        if format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+
+        if path == '-':
+            result = import_catalog(sys.stdin, format, options['chunk_size'])
+        else:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8', newline='') as f:
+                result = import_catalog(f, format, options['chunk_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if result.rejected > len(result.errors):
+            self.stderr.write(f'... and {result.rejected - len(result.errors)} more rejected rows')
+        self.stdout.write(
+            f'Imported {result.imported} rows in {result.elapsed:.2f}s '
+            f'({result.rows_per_sec:,.0f} rows/sec); rejected {result.rejected}'
+        )
+        self.stdout.write(self.style.SUCCESS('Successfully imported catalog'))
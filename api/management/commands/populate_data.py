@@ -1,43 +1,169 @@
-from django.core.management.base import BaseCommand
-from api.models import Brand, Product
+from contextlib import contextmanager
 import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.cache import bump_generation
+from api.models import Brand, Cart, CartItem, PriceBucket, Product, ProductFacet, User
+
+BRANDS = ['Nike', 'Adidas', 'Puma', 'Reebok', 'Under Armour']
+
+PRODUCTS = [
+    ('T-Shirt', 'Comfortable cotton t-shirt', 20.00),
+    ('Jeans', 'Classic blue jeans', 50.00),
+    ('Sneakers', 'Running shoes', 80.00),
+    ('Cap', 'Baseball cap', 15.00),
+    ('Watch', 'Digital watch', 100.00),
+    ('Socks', 'Cotton socks', 5.00),
+]
+MIN_PRICE = 0.01
+
+# Trade durability for speed while loading; the previous values are
+# restored afterwards. These are per-connection settings. journal_mode is
+# left alone: leaving WAL needs exclusive access to the database, which
+# fails while the server or anything else has it open.
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'temp_store': 'MEMORY',
+    'cache_size': '-262144',
+}
+
+
+@contextmanager
+def bulk_load_pragmas():
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        previous = {}
+        for pragma, value in BULK_LOAD_PRAGMAS.items():
+            previous[pragma] = cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        try:
+            yield
+        finally:
+            for pragma, value in previous.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+
 
 class Command(BaseCommand):
     help = 'Populate database with sample data'
 
-    def handle(self, *args, **kwargs):
-        brands = ['Nike', 'Adidas', 'Puma', 'Reebok', 'Under Armour']
-        for brand_name in brands:
-            Brand.objects.get_or_create(name=brand_name)
-
-        categories = [
-            'topwear', 'bottomwear', 'hats', 'footwear', 'accessories', 'gadgets'
-        ]
-        
-        genders = ['Men', 'Women', 'Kids', 'Unisex']
-
-        products_data = [
-            ('T-Shirt', 'Comfortable cotton t-shirt', 20.00),
-            ('Jeans', 'Classic blue jeans', 50.00),
-            ('Sneakers', 'Running shoes', 80.00),
-            ('Cap', 'Baseball cap', 15.00),
-            ('Watch', 'Digital watch', 100.00),
-            ('Socks', 'Cotton socks', 5.00),
-        ]
-
-        for i in range(50):
-            name_base, desc_base, price_base = random.choice(products_data)
-            brand = Brand.objects.order_by('?').first()
-            category = random.choice(categories)
-            gender = random.choice(genders)
-            
-            Product.objects.create(
-                name=f"{brand.name} {name_base} {i}",
-                description=f"{desc_base} for {gender}",
-                price=price_base + random.randint(-10, 10),
-                brand=brand,
-                category=category,
-                gender=gender
-            )
-            
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50, help='Number of products to create')
+        parser.add_argument('--brands', type=int, default=len(BRANDS), help='Number of brands to ensure exist')
+        parser.add_argument('--users', type=int, default=0, help='Number of users to create')
+        parser.add_argument('--carts', type=int, default=0, help='Number of the new users that get a cart')
+        parser.add_argument('--items-per-cart', type=int, default=5, help='Maximum distinct items per cart')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.stats = []
+
+        with bulk_load_pragmas():
+            brands = self.create_brands(options['brands'])
+            self.create_products(options['count'], brands)
+            # bulk_create() bypasses the signals that maintain summary tables
+            # and invalidate cached catalog responses.
+            ProductFacet.objects.rebuild()
+            PriceBucket.objects.rebuild()
+            bump_generation()
+            users = self.create_users(options['users'])
+            self.create_carts(users[:options['carts']], options['items_per_cart'])
+
+        for label, rows, elapsed in self.stats:
+            rate = rows / elapsed if elapsed else 0
+            self.stdout.write(f'{label}: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)')
         self.stdout.write(self.style.SUCCESS('Successfully populated database'))
+
+    @contextmanager
+    def timed(self, label):
+        counter = {'rows': 0}
+        start = time.perf_counter()
+        yield counter
+        self.stats.append((label, counter['rows'], time.perf_counter() - start))
+
+    def insert(self, model, rows, counter):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(model, batch, counter)
+                batch = []
+        if batch:
+            self.flush(model, batch, counter)
+
+    def flush(self, model, batch, counter):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+        counter['rows'] += len(batch)
+
+    def create_brands(self, count):
+        names = BRANDS[:count] + [f'Brand {i:05d}' for i in range(len(BRANDS), count)]
+        with self.timed('Brands') as counter:
+            Brand.objects.bulk_create([Brand(name=name) for name in names], ignore_conflicts=True)
+            counter['rows'] = len(names)
+        # Cache id -> name once instead of querying for a brand per product.
+        return dict(Brand.objects.filter(name__in=names).order_by('pk').values_list('pk', 'name'))
+
+    def create_products(self, count, brands):
+        brand_ids = list(brands)
+        categories = [key for key, _ in Product.CATEGORY_CHOICES]
+        genders = [key for key, _ in Product.GENDER_CHOICES]
+        rng = self.rng
+
+        def rows():
+            for i in range(count):
+                name_base, desc_base, price_base = rng.choice(PRODUCTS)
+                brand_id = rng.choice(brand_ids)
+                gender = rng.choice(genders)
+                yield Product(
+                    name=f"{brands[brand_id]} {name_base} {i}",
+                    description=f"{desc_base} for {gender}",
+                    # Jittered, but never below the smallest valid price.
+                    price=max(price_base + rng.randint(-10, 10), MIN_PRICE),
+                    brand_id=brand_id,
+                    category=rng.choice(categories),
+                    gender=gender,
+                )
+
+        with self.timed('Products') as counter:
+            self.insert(Product, rows(), counter)
+
+    def create_users(self, count):
+        if not count:
+            return []
+        # Hashing is deliberately slow, so every generated user shares one
+        # unusable password hash.
+        password = make_password(None)
+        start = (User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        usernames = [f'loaduser{n}' for n in range(start, start + count)]
+        with self.timed('Users') as counter:
+            self.insert(User, (User(username=name, password=password) for name in usernames), counter)
+        return list(User.objects.filter(pk__gte=start).values_list('pk', flat=True))
+
+    def create_carts(self, user_ids, items_per_cart):
+        if not user_ids:
+            return
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        with self.timed('Carts') as counter:
+            self.insert(Cart, (Cart(user_id=user_id) for user_id in user_ids), counter)
+
+        carts = list(Cart.objects.filter(user_id__gte=user_ids[0]).order_by('pk').values_list('pk', flat=True))
+        rng = self.rng
+
+        def rows():
+            for cart_id in carts:
+                size = rng.randint(1, min(items_per_cart, len(product_ids)))
+                for product_id in rng.sample(product_ids, size):
+                    yield CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 3))
+
+        with self.timed('Cart items') as counter:
+            self.insert(CartItem, rows(), counter)
+        # bulk_create() skips CartItem.save(), which maintains the totals.
+        Cart.objects.filter(pk__gte=carts[0]).recompute_totals()
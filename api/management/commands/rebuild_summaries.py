@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.models import PriceBucket, ProductFacet
+
+
+class Command(BaseCommand):
+    help = 'Rebuild catalog summary tables from the product table'
+
+    def handle(self, *args, **kwargs):
+        ProductFacet.objects.rebuild()
+        PriceBucket.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt product facets and price buckets'))
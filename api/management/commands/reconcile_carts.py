@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from api.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Find carts whose stored item_count/subtotal drifted from their items, and repair them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted carts')
+
+    def handle(self, *args, **options):
+        drifted = list(Cart.objects.drifted())
+        self.stdout.write(f'{len(drifted)} carts with drifted totals')
+        if drifted and options['verbosity'] > 1:
+            self.stdout.write('Cart ids: ' + ', '.join(map(str, drifted)))
+        if options['dry_run'] or not drifted:
+            return
+        # Recomputed in SQL rather than written from the values read above,
+        # so a cart changed in the meantime is not overwritten with stale totals.
+        for start in range(0, len(drifted), 500):
+            Cart.objects.filter(pk__in=drifted[start:start + 500]).recompute_totals()
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drifted)} carts'))
@@ -0,0 +1,152 @@
+"""
+In-process request metrics, exposed in the Prometheus text format.
+
+PerformanceMiddleware (api.middleware) opens a RequestStats for every
+request and `record_query` charges database queries to it; code that
+wants to attribute time to a stage wraps it in `timer(stage)`. Each
+finished request is folded into per-route summaries that keep a bounded
+window of recent samples for quantiles.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+METRICS = {
+    'duration': ('api_request_duration_seconds', 'Wall time spent handling the request.'),
+    'queries': ('api_request_db_queries', 'Database queries issued by the request.'),
+    'db_time': ('api_request_db_duration_seconds', 'Time spent in database queries.'),
+    'serializer': ('api_request_serializer_duration_seconds', 'Time spent serializing response data.'),
+    'size': ('api_response_size_bytes', 'Size of the response body.'),
+}
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self, capture_sql=False):
+        self.capture_sql = capture_sql
+        self.queries = 0
+        self.db_time = 0.0
+        self.stages = {}
+        self.sql = []
+
+    def record(self, elapsed, sql):
+        self.queries += 1
+        self.db_time += elapsed
+        if self.capture_sql:
+            self.sql.append((elapsed, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that charges the query to the current request.
+
+    It is installed once on every connection (see `install_query_recorder`)
+    rather than per request: async views run their queries on a worker
+    thread with its own connection objects, and the request's stats reach
+    that thread through the context variable.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(time.perf_counter() - start, sql)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def collect(capture_sql=False):
+    stats = RequestStats(capture_sql)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timer(stage):
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.stages[stage] = stats.stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+class Summary:
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0 for q in QUANTILES}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = {}
+
+    def observe(self, labels, values):
+        window = getattr(settings, 'PERFORMANCE_SAMPLE_WINDOW', 1024)
+        with self._lock:
+            for metric, value in values.items():
+                key = (metric, labels)
+                if key not in self._summaries:
+                    self._summaries[key] = Summary(window)
+                self._summaries[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+
+    def render(self):
+        with self._lock:
+            summaries = sorted(self._summaries.items())
+        lines = []
+        for metric, (name, help_text) in METRICS.items():
+            series = [(labels, summary) for (m, labels), summary in summaries if m == metric]
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} summary')
+            for labels, summary in series:
+                label_text = ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+                for q, value in summary.quantiles().items():
+                    lines.append(f'{name}{{{label_text},quantile="{q}"}} {value:g}')
+                lines.append(f'{name}_sum{{{label_text}}} {summary.sum:g}')
+                lines.append(f'{name}_count{{{label_text}}} {summary.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,137 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+logger = logging.getLogger('api.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Records wall time, query count, DB time, serializer time and response
+    size per route, and logs the SQL of requests over the configured
+    PERFORMANCE_QUERY_BUDGET / PERFORMANCE_LATENCY_BUDGET_MS.
+
+    Supports both WSGI and ASGI, so async views aren't pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'PERFORMANCE_QUERY_BUDGET', None)
+        self.latency_budget = getattr(settings, 'PERFORMANCE_LATENCY_BUDGET_MS', None)
+        self.capture_sql = self.query_budget is not None or self.latency_budget is not None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with metrics.collect(self.capture_sql) as stats:
+            response = self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with metrics.collect(self.capture_sql) as stats:
+            response = await self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        labels = (('method', request.method), ('route', match.route if match else 'unmatched'))
+        values = {
+            'duration': duration,
+            'queries': stats.queries,
+            'db_time': stats.db_time,
+            'serializer': stats.stages.get('serializer', 0.0),
+        }
+        if not response.streaming:
+            values['size'] = len(response.content)
+        metrics.registry.observe(labels, values)
+
+        if self.capture_sql and self.over_budget(stats.queries, duration):
+            logger.warning(
+                '%s %s took %.1f ms with %d queries:\n%s',
+                request.method, request.get_full_path(), duration * 1000, stats.queries,
+                '\n'.join(f'[{elapsed * 1000:.2f} ms] {sql}' for elapsed, sql in stats.sql),
+            )
+
+    def over_budget(self, queries, duration):
+        if self.query_budget is not None and queries > self.query_budget:
+            return True
+        return self.latency_budget is not None and duration * 1000 > self.latency_budget
+
+
+class ProfilingMiddleware:
+    """
+    Runs a random PROFILE_REQUEST_RATE share of requests under cProfile and
+    writes each profile to PROFILE_DIR as `<time>-<method>-<route>.prof`,
+    for pstats, snakeviz or a flame graph renderer such as flameprof.
+
+    At rate 0 it removes itself from the stack, so it costs nothing unless
+    enabled. Only one request is profiled at a time; under ASGI the profile
+    also includes whatever else runs on the event loop meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = getattr(settings, 'PROFILE_REQUEST_RATE', 0)
+        if not self.rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = settings.PROFILE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return random.random() < self.rate and self.lock.acquire(blocking=False)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile = cProfile.Profile()
+        try:
+            response = profile.runcall(self.get_response, request)
+        finally:
+            self.lock.release()
+        self.save(request, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.disable()
+            self.lock.release()
+        self.save(request, profile)
+        return response
+
+    def save(self, request, profile):
+        match = request.resolver_match
+        route = match.route if match else 'unmatched'
+        slug = ''.join(c if c.isalnum() else '_' for c in route).strip('_') or 'root'
+        path = os.path.join(self.directory, f'{time.time_ns()}-{request.method}-{slug}.prof')
+        profile.dump_stats(path)
+        logger.info('Profiled %s %s to %s', request.method, request.get_full_path(), path)
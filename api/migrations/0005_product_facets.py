@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+
+# Product.PRICE_RANGES as of this migration: (key, upper bound or None).
+PRICE_RANGES = [('0-10', 10), ('11-50', 50), ('51-100', 100), ('101-', None)]
+
+
+def price_range_expression():
+    *bounded, (last_key, _) = PRICE_RANGES
+    return Case(
+        *[When(price__lte=upper, then=Value(key)) for key, upper in bounded],
+        default=Value(last_key),
+        output_field=models.CharField(),
+    )
+
+
+def build_facets(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    ProductFacet = apps.get_model('api', 'ProductFacet')
+    rows = (
+        Product.objects.order_by()
+        .annotate(price_range=price_range_expression())
+        .values('brand', 'category', 'gender', 'price_range')
+        .annotate(count=Count('pk'))
+    )
+    ProductFacet.objects.bulk_create([
+        ProductFacet(
+            brand_id=row['brand'], category=row['category'], gender=row['gender'],
+            price_range=row['price_range'], count=row['count'],
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50)),
+                ('gender', models.CharField(max_length=10)),
+                ('price_range', models.CharField(max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.brand')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('brand', 'category', 'gender', 'price_range'), name='unique_product_facet')],
+            },
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
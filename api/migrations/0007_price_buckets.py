@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, When
+from django.db.models.functions import Cast
+
+
+def price_bucket_expression():
+    # Whole dollars truncated to two significant digits, for prices below
+    # $10^8 (max_digits=10): $1 buckets below $100, $10 below $1,000, ...
+    whens = [When(price__lt=100, then=Cast('price', models.IntegerField()))]
+    for digits in range(3, 9):
+        width = 10 ** (digits - 2)
+        whens.append(When(
+            price__lt=10 ** digits,
+            then=Cast(F('price') / width, models.IntegerField()) * width,
+        ))
+    return Case(*whens, output_field=models.IntegerField())
+
+
+def build_price_buckets(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    PriceBucket = apps.get_model('api', 'PriceBucket')
+    rows = (
+        Product.objects.order_by()
+        .annotate(bucket=price_bucket_expression())
+        .values('category', 'gender', 'bucket')
+        .annotate(count=Count('pk'))
+    )
+    PriceBucket.objects.bulk_create([PriceBucket(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_cart_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50)),
+                ('gender', models.CharField(max_length=10)),
+                ('bucket', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'gender', 'bucket'), name='unique_price_bucket')],
+            },
+        ),
+        migrations.RunPython(build_price_buckets, migrations.RunPython.noop),
+    ]
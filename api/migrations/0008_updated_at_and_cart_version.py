@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:18
+
+import api.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_price_buckets'),
+    ]
+
+    operations = [
+        # Unapplied last: removing the columns below rebuilds api_product
+        # again, so the triggers are reinstalled once they are gone.
+        migrations.RunPython(migrations.RunPython.noop, api.search.reinstall_triggers),
+        migrations.AddField(
+            model_name='brand',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # Adding a column with a default rebuilds api_product on SQLite,
+        # which drops the full-text search triggers.
+        migrations.RunPython(api.search.reinstall_triggers, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,158 @@
-from django.db import models
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Lower
+from django.contrib.auth.hashers import acheck_password, check_password, make_password
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+
+from .search import FullTextField, match_expression
 
 class User(AbstractUser):
-    pass
+    # Signed into every API token (see api.auth); incrementing it revokes
+    # all of the user's tokens at once.
+    token_epoch = models.PositiveIntegerField(default=0)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._password_changed = False
+
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        self._password_changed = True
+
+    def check_password(self, raw_password):
+        return check_password(raw_password, self.password, self.upgrade_password)
+
+    async def acheck_password(self, raw_password):
+        return await acheck_password(raw_password, self.password, self.aupgrade_password)
+
+    # Hash upgrades on login bypass set_password(): the password is the
+    # same, so the user's tokens stay valid.
+    def upgrade_password(self, raw_password):
+        self.password = make_password(raw_password)
+        self.save(update_fields=['password'])
+
+    async def aupgrade_password(self, raw_password):
+        self.password = make_password(raw_password)
+        await self.asave(update_fields=['password'])
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._password_changed and (update_fields is None or 'password' in update_fields):
+            # Tokens issued under the old password go.
+            self.token_epoch += 1
+            self._password_changed = False
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_epoch'}
+        super().save(*args, **kwargs)
 
 class Brand(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Serves the case-insensitive `?brand=` lookup on the product list.
+            models.Index(Lower('name'), name='brand_name_lower_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+def price_range_for(price):
+    for key, _, upper in Product.PRICE_RANGES:
+        if upper is None or price <= upper:
+            return key
+
+def price_range_condition(key):
+    """The bounds of one PRICE_RANGES bucket, as a range that product_price_idx serves."""
+    bounds = {k: upper for k, _, upper in Product.PRICE_RANGES}
+    keys = list(bounds)
+    index = keys.index(key)
+    lower = bounds[keys[index - 1]] if index else None
+    condition = Q()
+    if lower is not None:
+        condition &= Q(price__gt=lower)
+    if bounds[key] is not None:
+        condition &= Q(price__lte=bounds[key])
+    return condition
+
+def price_range_expression():
+    *bounded, (last_key, _, _) = Product.PRICE_RANGES
+    return Case(
+        *[When(price__lte=upper, then=Value(key)) for key, _, upper in bounded],
+        default=Value(last_key),
+        output_field=models.CharField(),
+    )
+
+def price_bucket(price):
+    """
+    The lower bound of the price histogram bucket holding `price`: its whole
+    part truncated to two significant digits, so buckets are $1 wide below
+    $100, $10 wide below $1,000 and so on.
+    """
+    whole = int(price)
+    return whole - whole % price_bucket_width(whole)
+
+def price_bucket_width(bucket):
+    return 1 if bucket < 100 else 10 ** (len(str(bucket)) - 2)
+
+def price_bucket_expression():
+    # price_bucket() in SQL, for products with prices below $10^8 (max_digits=10).
+    whens = [When(price__lt=100, then=Cast('price', models.IntegerField()))]
+    for digits in range(3, 9):
+        width = 10 ** (digits - 2)
+        whens.append(When(
+            price__lt=10 ** digits,
+            then=Cast(F('price') / width, models.IntegerField()) * width,
+        ))
+    return Case(*whens, output_field=models.IntegerField())
+
 class ProductQuerySet(models.QuerySet):
     def filter_by_gender(self, gender):
         return self.filter(gender=gender)
     
-    def price_range(self, min_price, max_price):
-        return self.filter(price__gte=min_price, price__lte=max_price)
+    def filter_by_brand(self, brand_name):
+        # Compare lower(name) rather than using `iexact` (LIKE on SQLite) so
+        # the expression index on Brand can be used.
+        return self.alias(brand_name_lower=Lower('brand__name')).filter(
+            brand_name_lower=Lower(Value(brand_name))
+        )
+
+    def price_range(self, min_price=None, max_price=None):
+        """Products priced within the inclusive bounds; either may be None."""
+        queryset = self
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+        return queryset
+
+    def filter_by_price_range(self, key):
+        return self.filter(price_range_condition(key))
+
+    def facet_counts(self):
+        """Product counts grouped by every facet, in one query."""
+        return (
+            self.order_by()
+            .annotate(price_range=price_range_expression())
+            .values('brand__name', 'category', 'gender', 'price_range')
+            .annotate(count=Count('pk'))
+        )
+
+    def search(self, query):
+        """Full-text search on name and description, best matches first."""
+        expression = match_expression(query)
+        if not expression:
+            return self.none()
+        if connections[self.db].vendor != 'sqlite':
+            return self.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        return self.filter(search_index__document__match=expression).order_by('search_index__rank')
 
 class ProductManager(models.Manager):
     def get_queryset(self):
@@ -23,10 +160,16 @@ class ProductManager(models.Manager):
 
     def filter_by_gender(self, gender):
         return self.get_queryset().filter_by_gender(gender)
+
+    def filter_by_brand(self, brand_name):
+        return self.get_queryset().filter_by_brand(brand_name)
     
-    def price_range(self, min_price, max_price):
+    def price_range(self, min_price=None, max_price=None):
         return self.get_queryset().price_range(min_price, max_price)
 
+    def search(self, query):
+        return self.get_queryset().search(query)
+
 class Product(models.Model):
     CATEGORY_CHOICES = [
         ('topwear', 'Top Wear'),
@@ -44,25 +187,307 @@ class Product(models.Model):
         ('Unisex', 'Unisex')
     ]
 
+    # (key, label, inclusive upper bound); each range starts where the
+    # previous one ends.
+    PRICE_RANGES = [
+        ('0-10', 'Under $10', 10),
+        ('11-50', '$11 - $50', 50),
+        ('51-100', '$51 - $100', 100),
+        ('101-', 'Over $100', None),
+    ]
+
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='products')
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES, default='Unisex')
+    updated_at = models.DateTimeField(auto_now=True)
     
     objects = ProductManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'gender', 'price'], name='product_cat_gender_price_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['gender', 'price'], name='product_gender_price_idx'),
+            models.Index(fields=['brand', 'price'], name='product_brand_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            # MAX(updated_at) seeds the catalog's Last-Modified time.
+            models.Index(fields=['updated_at'], name='product_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class ProductSearchIndex(models.Model):
+    """The FTS5 index over Product, maintained by triggers (see api.search)."""
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_index',
+    )
+    document = FullTextField(db_column='api_product_fts')
+    # FTS5's hidden bm25() rank column; lower is a better match.
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_product_fts'
+
+class SummaryQuerySet(models.QuerySet):
+    """Summary rows holding a `count` per unique key."""
+
+    def adjust(self, delta, **key):
+        """Atomically adds `delta` to the count of one key."""
+        row = self.filter(**key)
+        if row.update(count=F('count') + delta) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(count=delta, **key)
+        except IntegrityError:
+            row.update(count=F('count') + delta)
+
+class ProductFacetQuerySet(SummaryQuerySet):
+    def filter_by(self, gender=None, category=None, brand_name=None):
+        queryset = self.filter(count__gt=0)
+        if gender:
+            queryset = queryset.filter(gender=gender)
+        if category:
+            queryset = queryset.filter(category=category)
+        if brand_name:
+            queryset = queryset.alias(brand_name_lower=Lower('brand__name')).filter(
+                brand_name_lower=Lower(Value(brand_name))
+            )
+        return queryset
+
+    def total(self):
+        return self.aggregate(total=Sum('count'))['total'] or 0
+
+    def facet_counts(self):
+        return (
+            self.order_by()
+            .values('brand__name', 'category', 'gender', 'price_range')
+            .annotate(count=Sum('count'))
+        )
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([
+                ProductFacet(
+                    brand_id=row['brand'], category=row['category'], gender=row['gender'],
+                    price_range=row['price_range'], count=row['count'],
+                )
+                for row in Product.objects.order_by()
+                .annotate(price_range=price_range_expression())
+                .values('brand', 'category', 'gender', 'price_range')
+                .annotate(count=Count('pk'))
+            ])
+
+class ProductFacet(models.Model):
+    """
+    Product counts per (brand, category, gender, price range).
+
+    Kept up to date by the Product signal handlers in api.signals; bulk
+    writes that bypass signals must call `ProductFacet.objects.rebuild()`
+    (or run `manage.py rebuild_summaries`).
+    """
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    category = models.CharField(max_length=50)
+    gender = models.CharField(max_length=10)
+    price_range = models.CharField(max_length=10)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = ProductFacetQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['brand', 'category', 'gender', 'price_range'], name='unique_product_facet',
+            ),
+        ]
+
+class PriceBucketQuerySet(SummaryQuerySet):
+    def filter_by(self, category=None, gender=None):
+        queryset = self.filter(count__gt=0)
+        if category:
+            queryset = queryset.filter(category=category)
+        if gender:
+            queryset = queryset.filter(gender=gender)
+        return queryset
+
+    def histogram(self):
+        """(bucket, count) pairs, lowest bucket first."""
+        return self.order_by('bucket').values_list('bucket').annotate(count=Sum('count'))
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([
+                PriceBucket(**row)
+                for row in Product.objects.order_by()
+                .annotate(bucket=price_bucket_expression())
+                .values('category', 'gender', 'bucket')
+                .annotate(count=Count('pk'))
+            ])
+
+class PriceBucket(models.Model):
+    """
+    Product counts per (category, gender, price bucket), the price histogram
+    behind /api/products/price-stats/. See `price_bucket` for the buckets.
+
+    Kept up to date like ProductFacet; bulk writes that bypass signals must
+    call `PriceBucket.objects.rebuild()`.
+    """
+    category = models.CharField(max_length=50)
+    gender = models.CharField(max_length=10)
+    bucket = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    objects = PriceBucketQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'gender', 'bucket'], name='unique_price_bucket'),
+        ]
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        # Loads items, products and brands in one extra query regardless of cart size.
+        return self.prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product__brand').order_by('pk'))
+        )
+
+    def holding(self, product_ids):
+        """Carts with an item of any of `product_ids`."""
+        return self.filter(pk__in=CartItem.objects.filter(product_id__in=product_ids).values('cart'))
+
+    def add_items(self, product_id, quantity):
+        """Adds `quantity` units (negative to remove) of a product to the stored totals."""
+        price = Product.objects.filter(pk=product_id).values('price')
+        return self.update(
+            item_count=F('item_count') + quantity,
+            subtotal=F('subtotal') + ExpressionWrapper(Subquery(price) * quantity, output_field=money()),
+            **changed(),
+        )
+
+    def reprice(self, product_id, delta):
+        """Applies a price change of `delta` to the carts holding the product."""
+        quantity = CartItem.objects.filter(cart=OuterRef('pk'), product_id=product_id).values('quantity')
+        return self.filter(items__product_id=product_id).update(
+            subtotal=F('subtotal') + ExpressionWrapper(Subquery(quantity) * delta, output_field=money()),
+            **changed(),
+        )
+
+    def remove_product(self, product_id):
+        """Takes a product, about to be deleted, out of the stored totals."""
+        quantity = CartItem.objects.filter(cart=OuterRef('pk'), product_id=product_id).values('quantity')
+        price = Product.objects.filter(pk=product_id).values('price')
+        return self.filter(items__product_id=product_id).update(
+            item_count=F('item_count') - Subquery(quantity),
+            subtotal=F('subtotal') - ExpressionWrapper(Subquery(quantity) * Subquery(price), output_field=money()),
+            **changed(),
+        )
+
+    def drifted(self):
+        """Yields the ids of carts whose stored totals don't match their items."""
+        rows = self.annotate(**actual_totals()).values_list(
+            'pk', 'item_count', 'subtotal', 'actual_item_count', 'actual_subtotal',
+        )
+        # Compared in Python, after the decimal converters have rounded
+        # both sides, rather than in SQL where SQLite compares floats.
+        for pk, item_count, subtotal, actual_item_count, actual_subtotal in rows.iterator():
+            if (item_count, subtotal) != (actual_item_count, actual_subtotal):
+                yield pk
+
+    def recompute_totals(self):
+        """Rewrites the stored totals from the items, in one statement."""
+        totals = actual_totals()
+        return self.update(
+            item_count=totals['actual_item_count'], subtotal=totals['actual_subtotal'], **changed(),
+        )
+
+def changed():
+    """Update values that mark carts as changed, for their ETag and Last-Modified."""
+    return {'version': F('version') + 1, 'updated_at': timezone.now()}
+
+def money():
+    return models.DecimalField(max_digits=12, decimal_places=2)
+
+def actual_totals():
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    count = items.annotate(total=Sum('quantity')).values('total')
+    subtotal = items.annotate(total=Sum(F('product__price') * F('quantity'), output_field=money())).values('total')
+    return {
+        'actual_item_count': Coalesce(Subquery(count), 0),
+        'actual_subtotal': Coalesce(Subquery(subtotal), Value(Decimal('0.00')), output_field=money()),
+    }
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Totals over the items, kept up to date in the same transaction as
+    # every item change (see add_items/reprice); `manage.py reconcile_carts`
+    # repairs drift from writes that bypass them.
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # Bumped by every change to the cart's contents or totals (see changed()).
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CartQuerySet.as_manager()
 
     @property
     def total_value(self):
-        return sum(item.product.price * item.quantity for item in self.items.all())
+        return self.subtotal
+
+    def add_product(self, product, quantity=1):
+        """Adds `quantity` of `product` without a read-modify-write race."""
+        items = CartItem.objects.filter(cart=self, product=product)
+        with transaction.atomic():
+            if items.update(quantity=F('quantity') + quantity):
+                Cart.objects.filter(pk=self.pk).add_items(product.pk, quantity)
+                return
+        try:
+            with transaction.atomic():
+                # CartItem.save() updates the totals.
+                CartItem.objects.create(cart=self, product=product, quantity=quantity)
+        except IntegrityError:
+            # A concurrent request inserted the item after our UPDATE.
+            with transaction.atomic():
+                items.update(quantity=F('quantity') + quantity)
+                Cart.objects.filter(pk=self.pk).add_items(product.pk, quantity)
+
+    async def aadd_product(self, product, quantity=1):
+        # Keeping the totals in step needs a transaction, which the async
+        # ORM can't open.
+        await sync_to_async(self.add_product)(product, quantity)
+
+    def add_products(self, quantities):
+        """Adds several products at once; `quantities` maps product id to quantity."""
+        with transaction.atomic():
+            existing = list(self.items.select_for_update().filter(product_id__in=quantities))
+            for item in existing:
+                item.quantity += quantities[item.product_id]
+            CartItem.objects.bulk_update(existing, ['quantity'])
+            present = {item.product_id for item in existing}
+            CartItem.objects.bulk_create([
+                CartItem(cart=self, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items()
+                if product_id not in present
+            ])
+            prices = Product.objects.filter(pk__in=quantities).values_list('pk', 'price')
+            Cart.objects.filter(pk=self.pk).update(
+                item_count=F('item_count') + sum(quantities.values()),
+                subtotal=F('subtotal') + sum(price * quantities[pk] for pk, price in prices),
+                **changed(),
+            )
+
+    def clear(self):
+        with transaction.atomic():
+            self.items.all().delete()
+            Cart.objects.filter(pk=self.pk).update(item_count=0, subtotal=0, **changed())
 
     def __str__(self):
         return f"Cart of {self.user.username}"
@@ -72,5 +497,31 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Moves the cart totals by the difference this save makes.
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = CartItem.objects.filter(pk=self.pk).values_list('product_id', 'quantity').first()
+            super().save(*args, **kwargs)
+            carts = Cart.objects.filter(pk=self.cart_id)
+            if old and old[0] == self.product_id:
+                if self.quantity != old[1]:
+                    carts.add_items(self.product_id, self.quantity - old[1])
+                return
+            if old:
+                carts.add_items(old[0], -old[1])
+            carts.add_items(self.product_id, self.quantity)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Cart.objects.filter(pk=self.cart_id).add_items(self.product_id, -self.quantity)
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
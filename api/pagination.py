@@ -0,0 +1,118 @@
+import base64
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(position):
+    price, pk = position
+    return base64.urlsafe_b64encode(f'{price}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        price, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        price, pk = Decimal(price), int(pk)
+    except (ValueError, InvalidOperation, UnicodeDecodeError):
+        raise NotFound('Invalid cursor')
+    # Decimal() accepts NaN and Infinity, which no price compares against.
+    if not price.is_finite():
+        raise NotFound('Invalid cursor')
+    return price, pk
+
+
+def is_descending(queryset):
+    order_by = queryset.query.order_by
+    return bool(order_by) and order_by[0] == '-price'
+
+
+def apply_keyset(queryset, position, descending=False):
+    """Orders by (price, id) and seeks past `position` without an OFFSET scan."""
+    if descending:
+        queryset = queryset.order_by('-price', '-pk')
+    else:
+        queryset = queryset.order_by('price', 'pk')
+    if position is None:
+        return queryset
+    price, pk = position
+    # The leading price bound lets the database seek on the price index; the
+    # OR only breaks ties between rows with the same price.
+    if descending:
+        return queryset.filter(Q(price__lt=price) | Q(price=price, pk__lt=pk), price__lte=price)
+    return queryset.filter(Q(price__gt=price) | Q(price=price, pk__gt=pk), price__gte=price)
+
+
+class ProductKeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (price, id).
+
+    Pagination is opt-in: responses are only paginated when the request
+    carries a `cursor` or `page_size` parameter, so existing clients keep
+    receiving a plain list.
+    """
+    page_size = 20
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def page_queryset(self, queryset, request):
+        """
+        Returns the queryset for the requested page plus one lookahead row,
+        or None when the request is not paginated. Evaluate it and pass the
+        rows to `paginate_results`; splitting the two lets async views
+        evaluate the page with the async ORM.
+        """
+        params = request.GET
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.limit = self.get_page_size(request)
+        cursor = params.get(self.cursor_query_param)
+        position = decode_cursor(cursor) if cursor else None
+        return apply_keyset(queryset, position, is_descending(queryset))[:self.limit + 1]
+
+    def paginate_results(self, results, position=None):
+        """`position` maps a result to its (price, pk); defaults to model attributes."""
+        self.next_position = None
+        if len(results) > self.limit:
+            results = results[:self.limit]
+            last = results[-1]
+            self.next_position = position(last) if position else (last.price, last.pk)
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.page_queryset(queryset, request)
+        if page is None:
+            return None
+        return self.paginate_results(list(page))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,116 @@
+"""
+Import-time profiling for the manage.py, WSGI and ASGI entry points.
+
+With API_PROFILE_IMPORTS=1 in the environment, `startup()` times every
+module imported inside it and prints the slowest modules and packages to
+stderr when it exits. The entry points install it before Django is
+imported, so this module must not import Django itself.
+
+Modules are timed through their loaders: `self` is the time spent
+executing a module's own body, `total` adds the imports it triggered.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ENV_VAR = 'API_PROFILE_IMPORTS'
+TOP_MODULES = 30
+
+
+class TimedLoader:
+    """Wraps a module's loader to time its creation and execution."""
+
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        with self.timer.timing(spec.name):
+            return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self.timer.timing(module.__name__):
+            self.loader.exec_module(module)
+
+
+class ImportTimer:
+    """A meta path finder that records how long each imported module takes."""
+
+    def __init__(self):
+        # module name -> [self seconds, total seconds]
+        self.modules = {}
+        # Time spent in nested imports, per module being imported.
+        self.stack = []
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if hasattr(spec.loader, 'exec_module'):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    @contextmanager
+    def timing(self, name):
+        self.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            entry = self.modules.setdefault(name, [0.0, 0.0])
+            entry[0] += elapsed - nested
+            entry[1] += elapsed
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def report(self, label, elapsed, limit=TOP_MODULES):
+        total = sum(own for own, _ in self.modules.values())
+        lines = [
+            f'{label}: {elapsed * 1000:.1f} ms, {len(self.modules)} modules imported '
+            f'in {total * 1000:.1f} ms',
+            f"{'self ms':>9} {'total ms':>9}  module",
+        ]
+        slowest = sorted(self.modules.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        lines += [f'{own * 1000:9.1f} {cumulative * 1000:9.1f}  {name}' for name, (own, cumulative) in slowest]
+        packages = {}
+        for name, (own, _) in self.modules.items():
+            package = name.partition('.')[0]
+            packages[package] = packages.get(package, 0.0) + own
+        lines.append(f"{'self ms':>9} {'':>9}  package")
+        lines += [
+            f'{own * 1000:9.1f} {"":>9}  {package}'
+            for package, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+        ]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def startup(label, stream=None):
+    """Profiles the imports made inside the block when API_PROFILE_IMPORTS is set."""
+    if os.environ.get(ENV_VAR, '') in ('', '0'):
+        yield
+        return
+    timer = ImportTimer()
+    timer.install()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.uninstall()
+        print(timer.report(label, time.perf_counter() - start), file=stream or sys.stderr)
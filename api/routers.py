@@ -0,0 +1,36 @@
+"""
+Database routing for the read replica.
+
+Catalog reads (brands, products and their summary tables) go to the
+`replica` alias when it is configured; everything else, and every write,
+goes to `default`. Reads made inside a transaction on `default` stay
+there, so a transaction always sees its own uncommitted writes.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+CATALOG_MODELS = frozenset({'brand', 'product', 'productfacet', 'pricebucket'})
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'api' or model._meta.model_name not in CATALOG_MODELS:
+            return None
+        if REPLICA_DB_ALIAS not in connections.settings:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so objects read from the replica are saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
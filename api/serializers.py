@@ -1,17 +1,31 @@
 from rest_framework import serializers
+from .metrics import timer
 from .models import Brand, Product, CartItem, Cart
 
-class BrandSerializer(serializers.ModelSerializer):
+class TimedDataMixin:
+    """Reports the time spent building `.data` to the request metrics."""
+
+    @property
+    def data(self):
+        with timer('serializer'):
+            return super().data
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+class BrandSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Brand
         fields = ['id', 'name']
+        list_serializer_class = TimedListSerializer
 
-class ProductSerializer(serializers.ModelSerializer):
-    brand = serializers.StringRelatedField()
+class ProductSerializer(TimedDataMixin, serializers.ModelSerializer):
+    brand = serializers.SlugRelatedField(slug_field='name', queryset=Brand.objects.all())
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price', 'brand', 'category', 'gender']
+        list_serializer_class = TimedListSerializer
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -23,10 +37,18 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id', 'product', 'product_id', 'quantity']
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedDataMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'created_at', 'items', 'total_value']
+        fields = ['id', 'user', 'created_at', 'items', 'item_count', 'total_value']
+
+class CartBulkItemSerializer(serializers.Serializer):
+    # A plain integer rather than PrimaryKeyRelatedField: product ids are
+    # checked for the whole batch with one query in the view.
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
+class CartBulkSerializer(serializers.Serializer):
+    items = CartBulkItemSerializer(many=True, allow_empty=False, max_length=200)
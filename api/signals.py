@@ -0,0 +1,104 @@
+from decimal import Decimal
+
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .auth import forget_user, revoke_tokens
+from .cache import bump_generation
+from .metrics import install_query_recorder
+from .models import Brand, Cart, PriceBucket, Product, ProductFacet, User, price_bucket, price_range_for
+
+connection_created.connect(install_query_recorder, dispatch_uid='api.metrics.record_query')
+
+# Product fields that summary tables are keyed on.
+SUMMARY_FIELDS = ('brand_id', 'category', 'gender', 'price')
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Brand)
+def invalidate_catalog_cache(sender, instance, signal, using, **kwargs):
+    # After commit, or a concurrent request could cache the old rows under
+    # the new generation.
+    modified = instance.updated_at.timestamp() if signal is post_save else None
+    transaction.on_commit(lambda: bump_generation(modified), using=using)
+
+
+def facet_key(state):
+    brand_id, category, gender, price = state
+    return {
+        'brand_id': brand_id,
+        'category': category,
+        'gender': gender,
+        'price_range': price_range_for(Decimal(str(price))),
+    }
+
+
+def price_bucket_key(state):
+    _, category, gender, price = state
+    return {'category': category, 'gender': gender, 'bucket': price_bucket(Decimal(str(price)))}
+
+
+@receiver(pre_save, sender=Product)
+def remember_summary_state(sender, instance, using, **kwargs):
+    # Summaries and cart totals need the values the row had before this
+    # save, read from the database being written rather than a lagging replica.
+    instance._summary_state = None
+    if not instance._state.adding:
+        instance._summary_state = (
+            Product.objects.using(using).filter(pk=instance.pk).values_list(*SUMMARY_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def update_summaries_on_save(sender, instance, **kwargs):
+    old = getattr(instance, '_summary_state', None)
+    new = tuple(getattr(instance, field) for field in SUMMARY_FIELDS)
+    changes = []
+    for summary, key in ((ProductFacet, facet_key), (PriceBucket, price_bucket_key)):
+        old_key, new_key = key(old) if old else None, key(new)
+        if old_key != new_key:
+            changes.append((summary, old_key, new_key))
+    if not changes:
+        return
+    with transaction.atomic():
+        for summary, old_key, new_key in changes:
+            if old_key:
+                summary.objects.adjust(-1, **old_key)
+            summary.objects.adjust(1, **new_key)
+
+
+@receiver(post_delete, sender=Product)
+def update_summaries_on_delete(sender, instance, **kwargs):
+    state = tuple(getattr(instance, field) for field in SUMMARY_FIELDS)
+    ProductFacet.objects.adjust(-1, **facet_key(state))
+    PriceBucket.objects.adjust(-1, **price_bucket_key(state))
+
+
+@receiver(post_save, sender=Product)
+def update_cart_totals_on_save(sender, instance, **kwargs):
+    old = getattr(instance, '_summary_state', None)
+    if not old:
+        return
+    delta = Decimal(str(instance.price)) - old[SUMMARY_FIELDS.index('price')]
+    if delta:
+        Cart.objects.reprice(instance.pk, delta)
+
+
+@receiver(pre_delete, sender=Product)
+def update_cart_totals_on_delete(sender, instance, **kwargs):
+    # Before the cascade removes the items the totals are computed from.
+    Cart.objects.remove_product(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def revoke_tokens_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        revoke_tokens(user)
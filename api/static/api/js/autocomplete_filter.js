@@ -0,0 +1,10 @@
+'use strict';
+{
+    // Applies an AutocompleteFilter as soon as a value is picked.
+    const $ = django.jQuery;
+    $(document).on('select2:select', '.autocomplete-filter', function(event) {
+        const params = new URLSearchParams(this.dataset.queryString);
+        params.set(this.dataset.lookup, event.params.data.id);
+        window.location.search = params.toString();
+    });
+}
@@ -1,3 +1,1620 @@
-from django.test import TestCase
+import base64
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import gzip
+from io import StringIO
+from itertools import combinations
+import json
+import os
+import pstats
+import re
+import shutil
+import sys
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import profiling
+from .admin import PriceRangeFilter
+from .auth import issue_token
+from .benchmarks import SCENARIOS, compare
+from .cache import bump_generation, get_generation
+from .cart_store import get_cart_store
+from .checks import check_metrics_token, check_shared_caches
+from .imports import import_catalog
+from .metrics import registry
+from .models import Brand, Cart, CartItem, PriceBucket, Product, ProductFacet, User, price_bucket
+from .serializers import ProductSerializer
+from .views import ProductListCreate
+
+
+class ProductListQueryPlanTests(TestCase):
+    """Every filter combination accepted by ProductListCreate must be index-backed."""
+
+    FILTERS = {
+        'search': {'q': 'run'},
+        'gender': {'gender': 'Men'},
+        'category': {'category': 'footwear'},
+        'brand': {'brand': 'nike'},
+        'price': {'min_price': '10', 'max_price': '100'},
+    }
+    ORDERINGS = [None, 'price', '-price']
+    # A plan line that reads a table without an index, e.g. "SCAN api_product".
+    # FTS5 MATCH lookups show up as "SCAN ... VIRTUAL TABLE INDEX".
+    FULL_SCAN = re.compile(r'\bSCAN (api_\w+)\b(?! USING| VIRTUAL TABLE INDEX)')
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Nike')
+        Product.objects.create(
+            name='Sneakers', description='Running shoes', price=80,
+            brand=brand, category='footwear', gender='Men',
+        )
+
+    def explain(self, params):
+        request = APIRequestFactory().get('/api/products/', params)
+        view = ProductListCreate()
+        view.setup(request)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        return view.filter_queryset(view.get_queryset()).explain()
+
+    def filter_combinations(self):
+        names = list(self.FILTERS)
+        for size in range(len(names) + 1):
+            for combo in combinations(names, size):
+                for ordering in self.ORDERINGS:
+                    if not combo and ordering is None:
+                        # An unfiltered, unordered listing is a scan by design.
+                        continue
+                    params = {}
+                    for name in combo:
+                        params.update(self.FILTERS[name])
+                    if ordering:
+                        params['ordering'] = ordering
+                    yield params
+
+    def test_filters_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan assertions are written against SQLite EXPLAIN output.')
+        for params in self.filter_combinations():
+            with self.subTest(**params):
+                plan = self.explain(params)
+                self.assertIsNone(self.FULL_SCAN.search(plan), plan)
+
+    def test_brand_filter_is_case_insensitive(self):
+        request = APIRequestFactory().get('/api/products/', {'brand': 'NIKE'})
+        response = ProductListCreate.as_view()(request)
+        self.assertEqual([p['name'] for p in response.data], ['Sneakers'])
+
+
+class CartQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brands = [Brand.objects.create(name=f'Brand {i}') for i in range(3)]
+        cls.products = [
+            Product.objects.create(
+                name=f'Product {i}', description='', price=10 + i,
+                brand=cls.brands[i % 3], category='hats',
+            )
+            for i in range(12)
+        ]
+
+    def client_with_cart(self, username, size):
+        user = User.objects.create_user(username=username)
+        cart = Cart.objects.create(user=user)
+        for product in self.products[:size]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            response = func()
+        return len(ctx.captured_queries), response
+
+    def test_get_query_count_is_independent_of_cart_size(self):
+        small = self.client_with_cart('small', 1)
+        large = self.client_with_cart('large', 10)
+        small_count, _ = self.count_queries(lambda: small.get('/api/cart/'))
+        large_count, response = self.count_queries(lambda: large.get('/api/cart/'))
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data['items']), 10)
+        self.assertEqual(response.data['total_value'], sum(2 * p.price for p in self.products[:10]))
+
+    def test_post_query_count_is_independent_of_cart_size(self):
+        small = self.client_with_cart('small', 1)
+        large = self.client_with_cart('large', 10)
+        payload = {'product_id': self.products[11].pk, 'quantity': 1}
+        small_count, _ = self.count_queries(lambda: small.post('/api/cart/', payload))
+        large_count, response = self.count_queries(lambda: large.post('/api/cart/', payload))
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data['items']), 11)
+
+    def test_totals_are_read_from_the_cart_row(self):
+        self.client_with_cart('shopper', 3)
+        cart = Cart.objects.get(user__username='shopper')
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total_value, sum(2 * p.price for p in self.products[:3]))
+            self.assertEqual(cart.item_count, 6)
+
+
+class ProductKeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Puma')
+        # Repeated prices make sure ties are broken by id rather than skipped.
+        for i in range(25):
+            Product.objects.create(
+                name=f'Product {i}', description='', price=10 + i % 4, brand=brand,
+                category='footwear' if i % 2 else 'hats', gender='Men',
+            )
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def walk(self, params):
+        seen = []
+        response = self.client.get('/api/products/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            if not response.data['next']:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_listing_in_price_order(self):
+        products = self.walk({'page_size': 4})
+        expected = list(Product.objects.order_by('price', 'pk').values_list('pk', flat=True))
+        self.assertEqual([p['id'] for p in products], expected)
+
+    def test_descending_ordering(self):
+        products = self.walk({'page_size': 4, 'ordering': '-price'})
+        expected = list(Product.objects.order_by('-price', '-pk').values_list('pk', flat=True))
+        self.assertEqual([p['id'] for p in products], expected)
+
+    def test_composes_with_filters(self):
+        products = self.walk({'page_size': 3, 'category': 'footwear', 'min_price': 11, 'max_price': 12})
+        expected = list(
+            Product.objects.filter(category='footwear', price__range=(11, 12))
+            .order_by('price', 'pk').values_list('pk', flat=True)
+        )
+        self.assertEqual([p['id'] for p in products], expected)
+
+    def test_unpaginated_without_pagination_params(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(len(response.data), 25)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', 'TmFOfDE=', 'SW5maW5pdHl8MQ=='):  # NaN|1, Infinity|1
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/products/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class CatalogResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Reebok')
+        cls.product = Product.objects.create(
+            name='Cap', description='Baseball cap', price=15, brand=cls.brand, category='hats',
+        )
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def test_repeat_listing_is_served_from_cache(self):
+        self.client.get('/api/products/', {'category': 'hats', 'brand': 'Reebok'})
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', {'brand': 'reebok', 'category': 'hats'})
+        self.assertEqual([p['name'] for p in response.json()], ['Cap'])
+
+    def test_repeat_detail_is_served_from_cache(self):
+        self.client.get(f'/api/products/{self.product.pk}/')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/products/{self.product.pk}/')
+        self.assertEqual(response.json()['name'], 'Cap')
+
+    def test_product_save_invalidates(self):
+        self.client.get('/api/products/')
+        self.product.name = 'Beanie'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get('/api/products/').json()[0]['name'], 'Beanie')
+
+    def test_brand_save_invalidates(self):
+        self.client.get(f'/api/products/{self.product.pk}/')
+        self.brand.name = 'Reebok Classic'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.save()
+        response = self.client.get(f'/api/products/{self.product.pk}/')
+        self.assertEqual(response.json()['brand'], 'Reebok Classic')
+
+    def test_errors_are_not_cached(self):
+        self.client.get('/api/products/999/')
+        Product.objects.create(
+            id=999, name='Socks', description='', price=5, brand=self.brand, category='accessories',
+        )
+        self.assertEqual(self.client.get('/api/products/999/').status_code, 200)
+
+    def test_writes_invalidate_after_commit(self):
+        generation = get_generation()
+        with self.captureOnCommitCallbacks() as callbacks, transaction.atomic():
+            self.product.name = 'Beanie'
+            self.product.save()
+            # Another connection still reads the old row; caching it now
+            # must not be under a new generation.
+            self.assertEqual(get_generation(), generation)
+        self.assertEqual(get_generation(), generation)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generation(), generation)
+
+    def test_bump_increments_the_generation(self):
+        generation = get_generation()
+        bump_generation()
+        bump_generation()
+        self.assertEqual(get_generation(), generation + 2)
+
+    def test_deploy_check_warns_about_per_process_caches(self):
+        self.assertEqual([error.id for error in check_shared_caches(None)], ['api.W001', 'api.W001'])
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            'catalog': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }):
+            self.assertEqual(check_shared_caches(None), [])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'catalog-lru-test',
+            # Three responses plus the generation and last write time.
+            'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 5},
+        },
+    })
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = caches['catalog']
+        for category in ('hats', 'footwear', 'gadgets'):
+            self.client.get('/api/products/', {'category': category})
+        # Touch 'hats' so that 'footwear' becomes the least recently used.
+        self.client.get('/api/products/', {'category': 'hats'})
+        self.client.get('/api/products/', {'category': 'topwear'})
+        self.assertLessEqual(len(cache._cache), 5)
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/', {'category': 'hats'})
+        with self.assertNumQueries(1):
+            self.client.get('/api/products/', {'category': 'footwear'})
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Asics')
+        cls.product = Product.objects.create(
+            name='Runner', description='', price=40, brand=brand, category='footwear',
+        )
+        cls.user = User.objects.create_user(username='conditional')
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def test_catalog_not_modified_costs_no_queries(self):
+        for path in ('/api/products/', f'/api/products/{self.product.pk}/'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertTrue(response.has_header('ETag'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_catalog_write_changes_validators(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(
+            self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304,
+        )
+        self.product.price = 45
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json()[0]['price'], '45.00')
+
+    def test_last_modified_is_the_last_write_after_a_cold_start(self):
+        self.product.save()
+        caches['catalog'].clear()
+        response = self.client.get('/api/products/')
+        self.assertEqual(response['Last-Modified'], http_date(self.product.updated_at.timestamp()))
+
+    def test_etag_depends_on_params_and_format(self):
+        etags = {
+            self.client.get('/api/products/', params)['ETag']
+            for params in ({}, {'category': 'footwear'}, {'format': 'api'})
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_cart_not_modified_until_it_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertFalse(client.get('/api/cart/').has_header('ETag'))
+        client.post('/api/cart/', {'product_id': self.product.pk})
+        etag = client.get('/api/cart/')['ETag']
+        # One query for the cart's version; no items are loaded.
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.post('/api/cart/', {'product_id': self.product.pk})
+        response = client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 2)
+        self.assertEqual(Cart.objects.get(user=self.user).version, 2)
+
+    def test_cart_changes_with_catalog(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post('/api/cart/', {'product_id': self.product.pk})
+        etag = client.get('/api/cart/')['ETag']
+        self.product.price = 35
+        self.product.save()
+        self.assertEqual(client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(ROOT_URLCONF='api.async_urls')
+    async def test_async_views(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        await client.post('/api/cart/', {'product_id': self.product.pk}, 'application/json')
+        for path in ('/api/products/', f'/api/products/{self.product.pk}/', '/api/cart/'):
+            with self.subTest(path=path):
+                etag = (await client.get(path))['ETag']
+                self.assertEqual((await client.get(path, headers={'If-None-Match': etag})).status_code, 304)
+
+
+class AddToCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Adidas')
+        cls.product = Product.objects.create(
+            name='Jeans', description='', price=50, brand=brand, category='bottomwear',
+        )
+        cls.user = User.objects.create_user(username='shopper')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_adds_increment_one_row(self):
+        for quantity in (2, 3):
+            response = self.client.post('/api/cart/', {'product_id': self.product.pk, 'quantity': quantity})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['items'][0]['quantity'], 5)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_quantity_defaults_to_one(self):
+        response = self.client.post('/api/cart/', {'product_id': self.product.pk})
+        self.assertEqual(response.data['items'][0]['quantity'], 1)
+
+    def test_existing_item_is_incremented_in_place(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.add_product(self.product, 1)
+        with CaptureQueriesContext(connection) as ctx:
+            cart.add_product(self.product, 4)
+        # One UPDATE for the item and one for the cart totals, in one transaction.
+        statements = [query['sql'].split()[0] for query in ctx.captured_queries]
+        self.assertEqual([s for s in statements if s not in ('SAVEPOINT', 'RELEASE')], ['UPDATE', 'UPDATE'])
+        self.assertEqual(cart.items.get().quantity, 5)
+
+    def test_duplicate_rows_are_rejected(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product)
+        with self.assertRaises(IntegrityError):
+            CartItem.objects.create(cart=cart, product=self.product)
+
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+    # Outside a transaction, catalog reads go to the replica, a test mirror of default.
+    databases = {'default', 'replica'}
+    THREADS = 8
+    ADDS_PER_THREAD = 25
+
+    def test_no_lost_updates(self):
+        brand = Brand.objects.create(name='Under Armour')
+        product = Product.objects.create(
+            name='Socks', description='', price=5, brand=brand, category='accessories',
+        )
+        cart = Cart.objects.create(user=User.objects.create_user(username='racer'))
+
+        def add_once():
+            while True:
+                try:
+                    return Cart.objects.get(pk=cart.pk).add_product(product, 1)
+                except OperationalError as error:
+                    # The shared-cache in-memory test database reports
+                    # contention as "table is locked" without waiting; the
+                    # failed statement changed nothing, so try again.
+                    if 'locked' not in str(error):
+                        raise
+
+        def add_many():
+            try:
+                for _ in range(self.ADDS_PER_THREAD):
+                    add_once()
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            for future in [pool.submit(add_many) for _ in range(self.THREADS)]:
+                future.result()
+
+        self.assertEqual(cart.items.get().quantity, self.THREADS * self.ADDS_PER_THREAD)
+
+    def test_cart_store_scenario(self):
+        results = SCENARIOS['cart_store']({'users': 5, 'threads': 1, 'operations': 20, 'seed': 1})
+        for result in results['results'].values():
+            self.assertEqual((result['errors'], result['lost_updates'], result['drifted_carts']), (0, 0, 0))
+
+
+class ReadReplicaRouterTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_catalog_reads_use_the_replica_outside_transactions(self):
+        brand = Brand.objects.create(name='Asics')
+        Product.objects.create(name='Gel', description='', price=90, brand=brand, category='footwear')
+        self.assertEqual(Product.objects.all().db, 'replica')
+        self.assertEqual(Cart.objects.all().db, 'default')
+        with transaction.atomic():
+            self.assertEqual(Product.objects.all().db, 'default')
+
+        # Objects read from the replica are written to the primary.
+        product = Product.objects.get()
+        self.assertEqual(product._state.db, 'replica')
+        product.price = 80
+        # The pre-save state for summaries and cart totals comes from the primary.
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            product.save()
+        self.assertEqual(replica_queries.captured_queries, [])
+        cart = Cart.objects.create(user=User.objects.create_user(username='replica'))
+        cart.add_product(product, 2)
+        self.assertEqual(CartItem.objects.using('default').get().product_id, product.pk)
+        self.assertEqual(Cart.objects.get().subtotal, Decimal('160.00'))
+
+
+class CartTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Fila')
+        cls.cap = Product.objects.create(name='Cap', description='', price=Decimal('10.10'), brand=brand, category='hats')
+        cls.tee = Product.objects.create(name='Tee', description='', price=Decimal('20.20'), brand=brand, category='topwear')
+
+    def setUp(self):
+        self.cart = Cart.objects.create(user=User.objects.create_user(username='counter'))
+
+    def assertTotals(self, item_count, subtotal):
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (item_count, Decimal(subtotal)))
+        self.assertEqual(list(Cart.objects.drifted()), [])
+
+    def test_item_writes(self):
+        self.cart.add_product(self.cap, 2)
+        self.cart.add_product(self.cap, 1)
+        self.cart.add_products({self.cap.pk: 1, self.tee.pk: 2})
+        self.assertTotals(6, '80.80')
+        item = self.cart.items.get(product=self.cap)
+        item.quantity = 1
+        item.save()
+        self.assertTotals(3, '50.50')
+        item.product = Product.objects.create(
+            name='Hat', description='', price=Decimal('1.01'), brand=self.cap.brand, category='hats',
+        )
+        item.save()
+        self.assertTotals(3, '41.41')
+        item.delete()
+        self.assertTotals(2, '40.40')
+        self.cart.clear()
+        self.assertTotals(0, '0')
+
+    def test_product_price_change_and_delete(self):
+        self.cart.add_products({self.cap.pk: 3, self.tee.pk: 1})
+        self.cap.price = Decimal('5.05')
+        self.cap.save()
+        self.assertTotals(4, '35.35')
+        self.cap.delete()
+        self.assertTotals(1, '20.20')
+
+    def test_reconcile_repairs_drift(self):
+        self.cart.add_product(self.cap, 2)
+        Cart.objects.filter(pk=self.cart.pk).update(item_count=7)
+        out = StringIO()
+        call_command('reconcile_carts', dry_run=True, stdout=out)
+        self.assertIn('1 carts with drifted totals', out.getvalue())
+        call_command('reconcile_carts', stdout=out)
+        self.assertTotals(2, '20.20')
+
+
+class CartBulkItemsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Nike')
+        cls.products = [
+            Product.objects.create(name=f'Product {i}', description='', price=10, brand=brand, category='hats')
+            for i in range(40)
+        ]
+        cls.user = User.objects.create_user(username='restorer')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, items):
+        return self.client.post('/api/cart/items/', {'items': items}, format='json')
+
+    def test_adds_many_items_with_constant_queries(self):
+        items = [{'product_id': p.pk, 'quantity': 2} for p in self.products[:5]]
+        with CaptureQueriesContext(connection) as small:
+            self.post(items)
+        Cart.objects.all().delete()
+        items = [{'product_id': p.pk, 'quantity': 2} for p in self.products]
+        with CaptureQueriesContext(connection) as large:
+            response = self.post(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(len(response.data['cart']['items']), 40)
+        self.assertEqual(response.data['errors'], [])
+
+    def test_merges_with_existing_and_duplicate_items(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.add_product(self.products[0], 1)
+        response = self.post([
+            {'product_id': self.products[0].pk, 'quantity': 2},
+            {'product_id': self.products[1].pk},
+            {'product_id': self.products[1].pk, 'quantity': 3},
+        ])
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['cart']['items']}
+        self.assertEqual(quantities, {self.products[0].pk: 3, self.products[1].pk: 4})
+
+    def test_reports_unknown_products_per_item(self):
+        response = self.post([
+            {'product_id': self.products[0].pk},
+            {'product_id': 99999, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['cart']['items']), 1)
+        self.assertEqual(response.data['errors'], [{
+            'index': 1, 'product_id': 99999, 'error': 'Invalid pk "99999" - object does not exist.',
+        }])
+
+    def test_rejects_batch_without_known_products(self):
+        response = self.post([{'product_id': 99999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.filter(user=self.user, items__isnull=False).exists())
+
+    def test_rejects_malformed_items(self):
+        response = self.post([{'product_id': self.products[0].pk, 'quantity': 0}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+
+
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Fila')
+        cls.product = Product.objects.create(name='Cap', description='', price=10, brand=brand, category='hats')
+        cls.user = User.objects.create_user(username='token-holder', password='secret')
+        Cart.objects.create(user=cls.user).add_product(cls.product, 2)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def token(self):
+        response = self.client.post('/api/auth/token/', {'username': 'token-holder', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['token']
+
+    def get_cart(self, token):
+        return self.client.get('/api/cart/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def cart_queries(self):
+        """Queries for GET /api/cart/ beyond authentication."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get('/api/cart/')
+        return len(ctx.captured_queries)
+
+    def test_token_and_session_need_no_queries_once_cached(self):
+        token = self.token()
+        self.get_cart(token)
+        with self.assertNumQueries(self.cart_queries()):
+            response = self.get_cart(token)
+        self.assertEqual(response.json()['item_count'], 2)
+
+        # Sessions are cached when the cache is shared between processes.
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            client = Client()
+            client.force_login(self.user)
+            client.get('/api/cart/')
+            with self.assertNumQueries(self.cart_queries()):
+                self.assertEqual(client.get('/api/cart/').status_code, 200)
+
+    def test_invalid_tokens_are_rejected(self):
+        token = self.token()
+        self.assertEqual(self.get_cart(token[:-1] + ('A' if token[-1] != 'A' else 'B')).status_code, 403)
+        self.assertEqual(self.client.post('/api/auth/token/', {'username': 'token-holder', 'password': 'x'}).status_code, 400)
+        with override_settings(API_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.get_cart(token).status_code, 403)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_cart(token).status_code, 403)
+
+    def test_revocation(self):
+        token = self.token()
+        response = self.client.post('/api/auth/token/revoke/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_cart(token).status_code, 403)
+
+        token = self.token()
+        self.client.force_login(self.user)
+        self.client.logout()
+        self.assertEqual(self.get_cart(token).status_code, 403)
+
+    def test_password_change_revokes_tokens_and_sessions(self):
+        token = self.token()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/cart/').status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        user.save(update_fields=['password'])
+        self.assertEqual(self.get_cart(token).status_code, 403)
+        self.assertEqual(self.client.get('/api/cart/').status_code, 403)
+        response = self.client.post('/api/auth/token/', {'username': 'token-holder', 'password': 'changed'})
+        self.assertEqual(self.get_cart(response.json()['token']).status_code, 200)
+
+    def test_hash_upgrade_keeps_tokens(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            user = User.objects.get(pk=self.user.pk)
+            user.set_password('secret')
+            user.save()
+            token = self.token()
+        epoch = user.token_epoch
+        # Logging in rehashes the password with the preferred hasher.
+        with override_settings(PASSWORD_HASHERS=[
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+        ]):
+            response = self.client.post('/api/auth/token/', {'username': 'token-holder', 'password': 'secret'})
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.password.startswith('md5$'))
+        self.assertEqual((response.status_code, user.token_epoch), (200, epoch))
+        self.assertEqual(self.get_cart(token).status_code, 200)
+
+    @override_settings(ROOT_URLCONF='api.async_urls')
+    async def test_async_cart_view(self):
+        token = await sync_to_async(issue_token)(self.user)
+        client = AsyncClient()
+        response = await client.get('/api/cart/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.json()['item_count'], 2)
+        response = await client.get('/api/cart/', headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 403)
+
+
+class PopulateDataTests(TestCase):
+    def populate(self, **options):
+        out = StringIO()
+        call_command('populate_data', stdout=out, **options)
+        return out.getvalue()
+
+    def test_defaults_match_original_sample_data(self):
+        self.populate()
+        self.assertEqual(Brand.objects.count(), 5)
+        self.assertEqual(Product.objects.count(), 50)
+
+    def test_bulk_options(self):
+        output = self.populate(count=120, brands=12, users=10, carts=4, batch_size=50, seed=7)
+        self.assertEqual(Product.objects.count(), 120)
+        self.assertEqual(Brand.objects.count(), 12)
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Cart.objects.count(), 4)
+        self.assertTrue(CartItem.objects.exists())
+        self.assertIn('rows/sec', output)
+
+    def test_seed_is_reproducible(self):
+        self.populate(count=20, seed=3)
+        first = list(Product.objects.order_by('pk').values_list('name', 'price', 'category', 'gender'))
+        Product.objects.all().delete()
+        self.populate(count=20, seed=3)
+        second = list(Product.objects.order_by('pk').values_list('name', 'price', 'category', 'gender'))
+        self.assertEqual(first, second)
+
+    def test_invalidates_cached_catalog(self):
+        self.populate(count=5)
+        self.assertEqual(len(self.client.get('/api/products/').json()), 5)
+        self.populate(count=5)
+        self.assertEqual(len(self.client.get('/api/products/').json()), 10)
+
+    def test_prices_are_positive(self):
+        self.populate(count=200, seed=1)
+        self.assertFalse(Product.objects.filter(price__lt=Decimal('0.01')).exists())
+
+    def test_reruns_reuse_existing_brands(self):
+        self.populate(count=5)
+        self.populate(count=5)
+        self.assertEqual(Brand.objects.count(), 5)
+        self.assertEqual(Product.objects.count(), 10)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Nike')
+        cls.runner = Product.objects.create(
+            name='Running Sneakers', description='Lightweight running shoes for running fast',
+            price=80, brand=cls.brand, category='footwear', gender='Men',
+        )
+        cls.trainer = Product.objects.create(
+            name='Trainers', description='Everyday shoes, good for running errands',
+            price=60, brand=cls.brand, category='footwear', gender='Women',
+        )
+        cls.cap = Product.objects.create(
+            name='Cap', description='Baseball cap', price=15, brand=cls.brand, category='hats',
+        )
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def search(self, params):
+        return [p['name'] for p in self.client.get('/api/products/', params).json()]
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search({'q': 'running'}), ['Running Sneakers', 'Trainers'])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search({'q': 'sneak'}), ['Running Sneakers'])
+
+    def test_composes_with_filters(self):
+        self.assertEqual(self.search({'q': 'shoes', 'gender': 'Women'}), ['Trainers'])
+        self.assertEqual(self.search({'q': 'shoes', 'ordering': 'price'}), ['Trainers', 'Running Sneakers'])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search({'q': 'cap"*'}), ['Cap'])
+        self.assertEqual(self.search({'q': 'description:cap'}), [])
+        self.assertEqual(self.search({'q': '"'}), [])
+
+    def test_index_follows_writes(self):
+        self.cap.name = 'Beanie'
+        self.cap.save()
+        Product.objects.filter(pk=self.trainer.pk).update(description='Canvas shoes')
+        self.runner.delete()
+        Product.objects.bulk_create([
+            Product(name='Sandals', description='Summer shoes', price=20, brand=self.brand, category='footwear'),
+        ])
+        self.assertEqual(list(Product.objects.search('beanie')), [self.cap])
+        self.assertEqual(list(Product.objects.search('errands')), [])
+        self.assertEqual(list(Product.objects.search('running')), [])
+        self.assertEqual({p.name for p in Product.objects.search('shoes')}, {'Trainers', 'Sandals'})
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(username='admin', password='secret')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/api/product/', {'q': 'sneak'})
+        self.assertContains(response, 'Running Sneakers')
+        self.assertNotContains(response, 'Trainers')
+        self.assertTrue(any('MATCH' in q['sql'] for q in ctx.captured_queries))
+
+
+class ProductFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.nike = Brand.objects.create(name='Nike')
+        cls.puma = Brand.objects.create(name='Puma')
+        for name, brand, category, gender, price in [
+            ('Socks', cls.nike, 'accessories', 'Kids', 5),
+            ('Cap', cls.nike, 'hats', 'Men', 10),
+            ('Beanie', cls.puma, 'hats', 'Women', '10.50'),
+            ('Jeans', cls.puma, 'bottomwear', 'Men', 50),
+            ('Sneakers', cls.nike, 'footwear', 'Men', 80),
+            ('Watch', cls.puma, 'gadgets', 'Unisex', 150),
+        ]:
+            Product.objects.create(
+                name=name, description='', brand=brand, category=category, gender=gender, price=price,
+            )
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def facets(self, params=None):
+        return self.client.get('/api/products/facets/', params or {}).json()
+
+    def assertSummaryConsistent(self):
+        expected = {
+            (row['brand__name'], row['category'], row['gender'], row['price_range']): row['count']
+            for row in Product.objects.all().facet_counts()
+        }
+        actual = {
+            (row['brand__name'], row['category'], row['gender'], row['price_range']): row['count']
+            for row in ProductFacet.objects.filter_by().facet_counts()
+        }
+        self.assertEqual(actual, expected)
+
+    def test_counts_all_facets_in_one_query(self):
+        # Plus one for the catalog's last write time on a cold cache.
+        with self.assertNumQueries(2):
+            data = self.facets()
+        self.assertEqual(data['total'], 6)
+        self.assertEqual(data['facets']['brand'], {'Nike': 3, 'Puma': 3})
+        self.assertEqual(data['facets']['category']['hats'], 2)
+        self.assertEqual(data['facets']['category']['topwear'], 0)
+        self.assertEqual(data['facets']['gender']['Men'], 3)
+        self.assertEqual(data['facets']['price_range'], {'0-10': 2, '11-50': 2, '51-100': 1, '101-': 1})
+
+    def test_counts_follow_filters(self):
+        data = self.facets({'gender': 'Men', 'brand': 'nike'})
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['facets']['category']['hats'], 1)
+        self.assertEqual(data['facets']['brand'], {'Nike': 2})
+
+    def test_price_and_search_filters_fall_back_to_products(self):
+        data = self.facets({'min_price': 10, 'max_price': 60})
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['facets']['price_range']['11-50'], 2)
+        self.assertEqual(self.facets({'q': 'sneak'})['facets']['category']['footwear'], 1)
+
+    def test_summary_follows_product_writes(self):
+        product = Product.objects.get(name='Cap')
+        product.price = 99
+        product.category = 'topwear'
+        product.save()
+        Product.objects.get(name='Watch').delete()
+        Product.objects.create(
+            name='Shirt', description='', brand=self.puma, category='topwear', gender='Men', price=20,
+        )
+        self.assertSummaryConsistent()
+        self.puma.delete()
+        self.assertSummaryConsistent()
+        self.assertEqual(self.facets()['facets']['brand'], {'Nike': 3})
+
+    def test_rebuild(self):
+        Product.objects.filter(name='Cap').update(category='topwear')
+        ProductFacet.objects.rebuild()
+        self.assertSummaryConsistent()
+
+    def test_admin_price_range_filter(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret'))
+        response = self.client.get('/admin/api/product/', {'price_range': '11-50'})
+        self.assertContains(response, 'Beanie')
+        self.assertContains(response, 'Jeans')
+        self.assertNotContains(response, 'Sneakers')
+
+
+class ProductAdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='secret')
+        cls.brands = [Brand.objects.create(name=name) for name in ('Nike', 'Puma')]
+        cls.add_products(30)
+
+    @classmethod
+    def add_products(cls, count):
+        for i in range(count):
+            Product.objects.create(
+                name=f'Item {Product.objects.count()}', description='', price=5 + i * 7 % 120,
+                brand=cls.brands[i % 2], category='hats', gender='Men' if i % 3 else 'Women',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/api/product/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], [q['sql'] for q in ctx.captured_queries]
+
+    def test_query_count_is_constant(self):
+        self.changelist()  # Caches the session and user.
+        params = [{}, {'brand__id__exact': self.brands[0].pk}, {'price_range': '11-50', 'p': 2}]
+        before = [len(self.changelist(p)[1]) for p in params]
+        self.brands.append(Brand.objects.create(name='Fila'))
+        self.add_products(60)
+        self.assertEqual([len(self.changelist(p)[1]) for p in params], before)
+
+    def test_filtered_count_comes_from_facets(self):
+        for params, products in (
+            ({}, Product.objects.all()),
+            ({'brand__id__exact': self.brands[1].pk, 'gender__exact': 'Men'},
+             Product.objects.filter(brand=self.brands[1], gender='Men')),
+            ({'price_range': '51-100', 'o': '5'}, Product.objects.all().filter_by_price_range('51-100')),
+        ):
+            with self.subTest(params=params):
+                cl, queries = self.changelist(params)
+                self.assertEqual(cl.result_count, products.count())
+                self.assertFalse([sql for sql in queries if 'COUNT(*)' in sql and '"api_product"' in sql])
+
+    def test_search_is_counted(self):
+        cl, queries = self.changelist({'q': 'item'})
+        self.assertEqual(cl.result_count, 30)
+        self.assertTrue(any('COUNT(*)' in sql for sql in queries))
+
+    def test_brand_filter_lists_only_selected_brand(self):
+        response = self.client.get('/admin/api/product/', {'brand__id__exact': self.brands[0].pk})
+        self.assertContains(response, 'class="admin-autocomplete autocomplete-filter"')
+        self.assertContains(response, 'api/js/autocomplete_filter.js')
+        self.assertNotContains(response, f'brand__id__exact={self.brands[1].pk}')
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'api', 'model_name': 'product', 'field_name': 'brand', 'term': 'pu',
+        })
+        self.assertEqual([r['text'] for r in response.json()['results']], ['Puma'])
+
+    def test_price_range_facets_use_price_bounds(self):
+        cl, queries = self.changelist({'_facets': '1'})
+        self.assertFalse([sql for sql in queries if 'IN (SELECT' in sql])
+        price_filter = next(spec for spec in cl.filter_specs if isinstance(spec, PriceRangeFilter))
+        counts = [choice['display'] for choice in price_filter.choices(cl)][1:]
+        expected = [Product.objects.all().filter_by_price_range(key).count() for key, _, _ in Product.PRICE_RANGES]
+        self.assertEqual(counts, [f'{label} ({n})' for (_, label, _), n in zip(Product.PRICE_RANGES, expected)])
+
+
+class PriceStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Nike')
+        for i, price in enumerate(['4.99', '12.50', '12.75', '57', '99.99', '150', '1234.56', '250000']):
+            Product.objects.create(
+                name=f'Item {i}', description='', brand=cls.brand, price=price,
+                category='hats' if i % 2 else 'topwear', gender='Men',
+            )
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def assertHistogramConsistent(self):
+        actual = set(PriceBucket.objects.filter(count__gt=0).values_list('category', 'gender', 'bucket', 'count'))
+        PriceBucket.objects.rebuild()
+        self.assertEqual(actual, set(PriceBucket.objects.values_list('category', 'gender', 'bucket', 'count')))
+
+    def test_buckets(self):
+        for price, bucket in [('0.5', 0), ('99.99', 99), ('100', 100), ('1234.56', 1200), ('250000', 250000), ('99999999.99', 99000000)]:
+            self.assertEqual(price_bucket(Decimal(price)), bucket)
+        self.assertHistogramConsistent()
+
+    def test_open_ended_price_filters(self):
+        def names(params):
+            return {p['name'] for p in self.client.get('/api/products/', params).json()}
+
+        self.assertEqual(names({'min_price': 1000}), {'Item 6', 'Item 7'})
+        self.assertEqual(names({'max_price': 12.5}), {'Item 0', 'Item 1'})
+        self.assertEqual(names({'min_price': 12.5, 'max_price': 57}), {'Item 1', 'Item 2', 'Item 3'})
+
+    def test_malformed_price_bounds_are_rejected(self):
+        for path in ('/api/products/', '/api/products/facets/', '/api/products/export/'):
+            for params in ({'min_price': 'abc'}, {'max_price': 'abc'}, {'min_price': 'NaN'}, {'max_price': 'Infinity'}):
+                with self.subTest(path=path, params=params):
+                    response = self.client.get(path, params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(next(iter(params)), response.json())
+
+    def test_stats_come_from_the_histogram(self):
+        # The catalog's last write time (cold cache), the histogram, then
+        # the minimum and maximum by index.
+        with self.assertNumQueries(4):
+            stats = self.client.get('/api/products/price-stats/').json()
+        self.assertEqual((stats['count'], stats['min'], stats['max']), (8, '4.99', '250000.00'))
+        self.assertEqual(stats['buckets'][:2], [
+            {'min': '4.00', 'max': '5.00', 'count': 1}, {'min': '12.00', 'max': '13.00', 'count': 2},
+        ])
+        self.assertEqual(stats['buckets'][-1], {'min': '250000.00', 'max': '260000.00', 'count': 1})
+        self.assertEqual(stats['quantiles']['p50'], '58.00')
+        self.assertEqual(stats['quantiles']['p99'], '250000.00')
+
+        hats = self.client.get('/api/products/price-stats/', {'category': 'hats'}).json()
+        self.assertEqual((hats['count'], hats['min'], hats['max']), (4, '12.50', '250000.00'))
+        empty = self.client.get('/api/products/price-stats/', {'gender': 'Kids'}).json()
+        self.assertEqual((empty['count'], empty['quantiles']['p50'], empty['buckets']), (0, None, []))
+
+    def test_histogram_follows_product_writes(self):
+        product = Product.objects.get(name='Item 3')
+        product.price = '57.80'
+        product.save()
+        product.price = 310
+        product.gender = 'Women'
+        product.save()
+        Product.objects.get(name='Item 7').delete()
+        self.assertHistogramConsistent()
+        self.assertEqual(self.client.get('/api/products/price-stats/').json()['max'], '1234.56')
+
+
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Nike')
+        Product.objects.create(name='Cap', description='', price=15, brand=brand, category='hats')
+
+    def setUp(self):
+        caches['catalog'].clear()
+        registry.reset()
+
+    def metrics(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_records_per_route_stats(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        text = self.metrics()
+        labels = 'method="GET",route="api/products/"'
+        self.assertIn('# TYPE api_request_duration_seconds summary', text)
+        self.assertIn(f'api_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'api_request_duration_seconds{{{labels},quantile="0.99"}}', text)
+        # The first request misses the cache and runs two queries (the
+        # catalog's last write time and the listing); the second is a hit.
+        self.assertIn(f'api_request_db_queries_sum{{{labels}}} 2', text)
+        self.assertIn(f'api_request_serializer_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'api_response_size_bytes_count{{{labels}}} 2', text)
+
+    @override_settings(ROOT_URLCONF='api.async_urls')
+    async def test_records_queries_of_async_views(self):
+        await AsyncClient().get('/api/products/')
+        labels = 'method="GET",route="api/products/"'
+        self.assertIn(f'api_request_db_queries_sum{{{labels}}} 2', registry.render())
+
+    def test_metrics_endpoint_is_local_only(self):
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(API_METRICS_TOKEN='scrape')
+    def test_metrics_token_replaces_the_address_check(self):
+        # A reverse proxy on the same host forwards every request from loopback.
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        wrong = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(wrong.status_code, 403)
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.5', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(API_METRICS_TOKEN=None):
+            self.assertEqual([error.id for error in check_metrics_token(None)], ['api.W002'])
+        self.assertEqual(check_metrics_token(None), [])
+
+    @override_settings(PERFORMANCE_QUERY_BUDGET=0)
+    def test_logs_sql_of_requests_over_query_budget(self):
+        with self.assertLogs('api.performance', 'WARNING') as logs:
+            self.client.get('/api/products/')
+        self.assertIn('FROM "api_product"', logs.output[0])
+
+    @override_settings(PERFORMANCE_QUERY_BUDGET=5)
+    def test_requests_within_budget_are_not_logged(self):
+        with self.assertNoLogs('api.performance', 'WARNING'):
+            self.client.get('/api/products/')
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Nike')
+        Product.objects.create(name='Cap', description='', price=15, brand=brand, category='hats')
+
+    def setUp(self):
+        caches['catalog'].clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_sampled_requests_are_profiled(self):
+        with override_settings(PROFILE_REQUEST_RATE=1, PROFILE_DIR=self.directory):
+            self.assertEqual(Client().get('/api/products/').status_code, 200)
+        [name] = self.profiles()
+        self.assertTrue(name.endswith('-GET-api_products.prof'))
+        stats = pstats.Stats(os.path.join(self.directory, name))
+        self.assertTrue(any(func[2] == 'list' for func in stats.stats))
+
+        with override_settings(PROFILE_REQUEST_RATE=0, PROFILE_DIR=self.directory):
+            Client().get('/api/products/')
+        self.assertEqual(len(self.profiles()), 1)
+
+    async def test_async_requests_are_profiled(self):
+        with override_settings(
+            PROFILE_REQUEST_RATE=1, PROFILE_DIR=self.directory, ROOT_URLCONF='api.async_urls',
+        ):
+            self.assertEqual((await AsyncClient().get('/api/products/')).status_code, 200)
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_startup_reports_import_times(self):
+        sys.modules.pop('colorsys', None)
+        output = StringIO()
+        with mock.patch.dict(os.environ, {'API_PROFILE_IMPORTS': '1'}):
+            with profiling.startup('test startup', stream=output):
+                import colorsys  # noqa: F401
+        self.assertRegex(output.getvalue(), r'^test startup: [\d.]+ ms, 1 modules imported')
+        self.assertRegex(output.getvalue(), r'\n +[\d.]+ +[\d.]+  colorsys\n')
+        self.assertNotIn(profiling.ImportTimer, map(type, sys.meta_path))
+
+        output = StringIO()
+        with profiling.startup('disabled', stream=output):
+            pass
+        self.assertEqual(output.getvalue(), '')
+
+
+class AsyncViewTests(TestCase):
+    """The async views must answer exactly like the sync views they replace."""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Asics')
+        cls.products = [
+            Product.objects.create(
+                name=f'Runner {i}', description='', price=20 + i % 3, brand=brand,
+                category='footwear', gender='Women' if i % 2 else 'Men',
+            )
+            for i in range(7)
+        ]
+        cls.user = User.objects.create_user(username='async-shopper', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def both(self, method, path, data=None, **extra):
+        responses = []
+        for urlconf in ('ecommerce_practice.urls', 'api.async_urls'):
+            caches['catalog'].clear()
+            with override_settings(ROOT_URLCONF=urlconf):
+                responses.append(getattr(self.client, method)(path, data, **extra))
+        sync, async_ = responses
+        self.assertEqual(sync.status_code, async_.status_code)
+        self.assertEqual(sync.content, async_.content)
+        return async_
+
+    def test_product_listing_matches_sync(self):
+        for params in (
+            {}, {'gender': 'Men', 'ordering': '-price'}, {'page_size': 3},
+            {'page_size': 2, 'cursor': 'not-a-cursor'}, {'q': 'runner', 'min_price': 21, 'max_price': 22},
+        ):
+            with self.subTest(params=params):
+                self.both('get', '/api/products/', params)
+
+    def test_malformed_price_bound_matches_sync(self):
+        response = self.both('get', '/api/products/', {'min_price': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()), ['min_price'])
+
+    def test_product_detail_matches_sync(self):
+        self.assertEqual(self.both('get', f'/api/products/{self.products[0].pk}/').status_code, 200)
+        self.assertEqual(self.both('get', '/api/products/999/').status_code, 404)
+
+    def test_cart_matches_sync(self):
+        self.both('get', '/api/cart/')
+        with override_settings(ROOT_URLCONF='api.async_urls'):
+            for payload in (
+                {'product_id': self.products[0].pk, 'quantity': 2},
+                {'product_id': self.products[0].pk},
+            ):
+                response = self.client.post('/api/cart/', payload, content_type='application/json')
+                self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['items'][0]['quantity'], 3)
+        self.assertEqual(self.both('get', '/api/cart/').json()['total_value'], 60)
+        self.assertEqual(self.both('post', '/api/cart/', {'product_id': 999}).status_code, 400)
+
+    def test_cart_requires_authentication(self):
+        self.client.logout()
+        self.both('get', '/api/cart/')
+        auth = 'Basic ' + base64.b64encode(b'async-shopper:wrong').decode()
+        self.both('get', '/api/cart/', HTTP_AUTHORIZATION=auth)
+
+    def test_cart_errors_match_sync(self):
+        self.both('post', '/api/cart/', '{"product_id":', content_type='application/json')
+        self.both('post', '/api/cart/', {'product_id': self.products[0].pk, 'quantity': 'many'})
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.assertEqual(self.both('post', '/api/cart/', {'product_id': self.products[0].pk}).status_code, 403)
+
+    @override_settings(ROOT_URLCONF='api.async_urls')
+    async def test_cart_under_asgi(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.post(
+            '/api/cart/', {'product_id': self.products[1].pk}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await client.delete('/api/cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(await CartItem.objects.aexists())
+
+
+class ProductExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brands = [Brand.objects.create(name=name) for name in ('Nike', 'Puma')]
+        for i in range(7):
+            Product.objects.create(
+                name=f'Tee {i}', description='Cotton "crew" neck', price=Decimal('9.5') + i,
+                brand=brands[i % 2], category='topwear' if i % 3 else 'hats', gender='Men',
+            )
+
+    def expected(self, **filters):
+        products = Product.objects.select_related('brand').filter(**filters).order_by('pk')
+        return json.loads(json.dumps(ProductSerializer(products, many=True).data))
+
+    def test_ndjson_matches_serializer(self):
+        response = self.client.get('/api/products/export/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        with self.assertNumQueries(1):
+            body = b''.join(response.streaming_content)
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(records, self.expected())
+
+    def test_json_array_with_filters(self):
+        response = self.client.get('/api/products/export/', {'format': 'json', 'category': 'hats'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), self.expected(category='hats'))
+
+    def test_gzip(self):
+        response = self.client.get('/api/products/export/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(body.decode().splitlines()), 7)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/api/products/export/', {'format': 'xml'}).status_code, 400)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.json.gz')
+            call_command(
+                'export_catalog', format='json', gzip=True, output=path, chunk_size=2,
+                brand='puma', stdout=StringIO(),
+            )
+            with gzip.open(path) as f:
+                self.assertEqual(json.load(f), self.expected(brand__name='Puma'))
+
+
+class CatalogImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Nike')
+        cls.product = Product.objects.create(
+            name='Cap', description='', price=15, brand=cls.brand, category='hats',
+        )
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, body, content_type):
+        return self.client.generic('POST', '/api/products/import/', body, content_type)
+
+    def test_csv_upserts_and_creates_brands(self):
+        body = (
+            'id,name,description,price,brand,category,gender\n'
+            f'{self.product.pk},Cap v2,Wool,17.5,NIKE,hats,Men\n'
+            ',Boots,Leather,120,Timberland,footwear,\n'
+            ',Scarf,,5,Timberland,scarves,Women\n'
+        )
+        response = self.post(body, 'text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['errors'], [{'line': 4, 'error': '"scarves" is not a valid category.'}])
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.price, self.product.brand), ('Cap v2', Decimal('17.50'), self.brand))
+        boots = Product.objects.get(name='Boots')
+        self.assertEqual((boots.brand.name, boots.gender), ('Timberland', 'Unisex'))
+        self.assertEqual(Brand.objects.count(), 2)
+        # Summaries and search, which bulk writes bypass, are up to date.
+        self.assertEqual(ProductFacet.objects.filter(category='footwear').get().count, 1)
+        self.assertEqual(list(Product.objects.search('leather')), [boots])
+
+    def test_ndjson_round_trips_export(self):
+        export = b''.join(self.client.get('/api/products/export/').streaming_content)
+        self.client.get('/api/products/')
+        response = self.post(export.replace(b'"Cap"', b'"Beanie"') + b'not json\n', 'application/x-ndjson')
+        self.assertEqual((response.data['imported'], response.data['rejected']), (1, 1))
+        self.assertEqual(Product.objects.get().name, 'Beanie')
+        # The bulk write invalidated the cached listing.
+        self.assertEqual(self.client.get('/api/products/').json()[0]['name'], 'Beanie')
+
+    def test_all_rejected(self):
+        response = self.post('{"name": "Cap", "price": "NaN"}\n', 'application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['rejected'], 1)
+
+    def test_failure_mid_stream_finishes_written_chunks(self):
+        def lines():
+            yield 'name,price,brand,category\n'
+            yield 'Boots,120,Timberland,footwear\n'
+            yield 'Tee,10,Timberland,topwear\n'
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        generation = get_generation()
+        with self.assertRaises(UnicodeDecodeError):
+            import_catalog(lines(), 'csv', chunk_size=1)
+        self.assertEqual(ProductFacet.objects.filter(category='footwear').get().count, 1)
+        self.assertNotEqual(get_generation(), generation)
+
+    def test_malformed_csv(self):
+        body = 'name,price,brand,category\n"' + 'x' * (csv.field_size_limit() + 1) + '",1,Nike,hats\n'
+        self.assertEqual(self.post(body, 'text/csv').status_code, 400)
+
+    def test_only_carts_holding_upserted_products_change(self):
+        other = Product.objects.create(name='Tee', description='', price=10, brand=self.brand, category='topwear')
+        carts = {}
+        for product in (self.product, other):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user(username=f'holder-{product.pk}'))
+            client.post('/api/cart/', {'product_id': product.pk})
+            carts[product] = Cart.objects.get(items__product=product)
+        self.post(f'id,name,price,brand,category\n{self.product.pk},Cap,20,Nike,hats\n', 'text/csv')
+        holder, bystander = (Cart.objects.get(pk=carts[product].pk) for product in (self.product, other))
+        self.assertEqual((holder.subtotal, holder.version), (Decimal('20.00'), carts[self.product].version + 1))
+        self.assertEqual(bystander.version, carts[other].version)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(User.objects.create_user(username='shopper'))
+        self.assertEqual(self.post('', 'text/csv').status_code, 403)
+
+    def test_unsupported_media_type(self):
+        self.assertEqual(self.post('[]', 'application/json').status_code, 415)
+
+    def test_command_reads_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.csv')
+            with open(path, 'w') as f:
+                f.write('name,price,brand,category\n')
+                f.writelines(f'Tee {i},{i + 1},Puma,topwear\n' for i in range(5))
+            out = StringIO()
+            call_command('import_catalog', path, chunk_size=2, stdout=out)
+        self.assertIn('Imported 5 rows', out.getvalue())
+        self.assertEqual(Product.objects.filter(brand__name='Puma').count(), 5)
+
+    def test_product_brand_is_writable_by_name(self):
+        response = self.client.post('/api/products/', {
+            'name': 'Socks', 'description': 'Wool', 'price': '5.00', 'brand': 'Nike', 'category': 'accessories',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['brand'], 'Nike')
+
+
+class FastSerializerTests(TestCase):
+    """The row serializers must render exactly the bytes the DRF serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        brands = [Brand.objects.create(name=name) for name in ('Nike', 'Puma "Red"')]
+        cls.products = [
+            Product.objects.create(
+                name=f'Tee {i} \u00e9', description='Line\nbreak', price=Decimal('1000.5') / (i + 1),
+                brand=brands[i % 2], category='topwear', gender='Women',
+            )
+            for i in range(6)
+        ]
+        cls.user = User.objects.create_user(username='fast-shopper')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def both(self, path, params=None):
+        responses = []
+        for fast in (False, True):
+            caches['catalog'].clear()
+            with override_settings(API_FAST_SERIALIZERS=fast):
+                responses.append(self.client.get(path, params))
+        self.assertEqual(responses[0].status_code, responses[1].status_code)
+        self.assertEqual(responses[0].content, responses[1].content)
+        return responses[1]
+
+    def test_products_match(self):
+        self.both('/api/products/')
+        self.both('/api/products/', {'ordering': '-price', 'page_size': 4})
+        self.both(f'/api/products/{self.products[2].pk}/')
+        self.assertEqual(self.both('/api/products/999/').status_code, 404)
+
+    def test_brands_match(self):
+        self.both('/api/brands/')
+
+    def test_cart_matches(self):
+        self.both('/api/cart/')
+        cart = Cart.objects.get(user=self.user)
+        for product in reversed(self.products[:4]):
+            cart.add_product(product, 3)
+        self.both('/api/cart/')
+
+    @override_settings(API_FAST_SERIALIZERS=True)
+    def test_paginated_walk(self):
+        caches['catalog'].clear()
+        response = self.client.get('/api/products/', {'page_size': 4})
+        next_page = self.client.get(response.json()['next']).json()
+        ids = [p['id'] for p in response.json()['results'] + next_page['results']]
+        self.assertEqual(ids, list(Product.objects.order_by('price', 'pk').values_list('pk', flat=True)))
+
+
+class WriteBehindCartStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Fila')
+        cls.cap = Product.objects.create(name='Cap', description='', price=Decimal('10.10'), brand=brand, category='hats')
+        cls.tee = Product.objects.create(name='Tee', description='', price=Decimal('20.20'), brand=brand, category='topwear')
+        cls.user = User.objects.create_user(username='write-behind')
+
+    def setUp(self):
+        # Enabled per test so the store's final flush runs inside the test transaction.
+        store_settings = override_settings(
+            CART_STORE='api.cart_store.WriteBehindCartStore',
+            CART_STORE_OPTIONS={'flush_interval': None, 'max_dirty': 100},
+        )
+        store_settings.enable()
+        self.addCleanup(store_settings.disable)
+        self.client.force_login(self.user)
+
+    def add(self, product, quantity, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        response = self.client.post('/api/cart/', {'product_id': product.pk, 'quantity': quantity}, 'application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def stored(self):
+        return dict(CartItem.objects.values_list('product__name', 'quantity'))
+
+    def test_adds_are_written_behind(self):
+        self.add(self.cap, 2)
+        cart = self.add(self.tee, 1)
+        self.add(self.cap, 1)
+        self.assertEqual((cart['item_count'], cart['total_value']), (3, 40.4))
+        self.assertEqual(self.stored(), {})
+
+        self.assertEqual(get_cart_store().flush(), 1)
+        self.assertEqual(self.stored(), {'Cap': 3, 'Tee': 1})
+        self.assertEqual(list(Cart.objects.drifted()), [])
+        cached = self.client.get('/api/cart/').json()
+        with override_settings(CART_STORE='api.cart_store.DatabaseCartStore', CART_STORE_OPTIONS={}):
+            stored = self.client.get('/api/cart/').json()
+        # The same cart, less the item ids the write-behind store leaves out.
+        for item in stored['items']:
+            del item['id']
+        self.assertEqual(stored, cached)
+        self.assertNotIn('id', cart['items'][0])
+        self.assertEqual(get_cart_store().flush(), 0)
+
+    def test_version_is_written_behind(self):
+        self.add(self.cap, 1)
+        etag = self.client.get('/api/cart/')['ETag']
+        self.add(self.cap, 1)
+        self.assertNotEqual(self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        get_cart_store().flush()
+        self.assertEqual(Cart.objects.get(user=self.user).version, 2)
+
+    def test_clear_and_bulk_add(self):
+        response = self.client.post('/api/cart/items/', {'items': [
+            {'product_id': self.cap.pk, 'quantity': 1}, {'product_id': self.tee.pk, 'quantity': 2},
+        ]}, 'application/json')
+        self.assertEqual(response.json()['cart']['item_count'], 3)
+        get_cart_store().flush()
+        self.assertEqual(self.client.delete('/api/cart/').status_code, 204)
+        self.assertEqual(self.client.get('/api/cart/').json()['items'], [])
+        self.assertEqual(self.stored(), {'Cap': 1, 'Tee': 2})
+        get_cart_store().flush()
+        self.assertEqual(self.stored(), {})
+        self.assertEqual(Cart.objects.get(user=self.user).item_count, 0)
+
+        self.client.force_login(User.objects.create_user(username='no-cart'))
+        self.assertEqual(self.client.delete('/api/cart/').status_code, 404)
+
+    @override_settings(CART_STORE_OPTIONS={'flush_interval': None, 'max_dirty': 2})
+    def test_flushes_once_enough_carts_are_dirty(self):
+        self.add(self.cap, 1)
+        self.add(self.cap, 1)
+        self.assertEqual(self.stored(), {})
+        self.add(self.tee, 1, user=User.objects.create_user(username='second'))
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_pending_carts_are_flushed_at_exit_without_a_writer(self):
+        with mock.patch('api.cart_store.atexit') as mocked:
+            self.add(self.cap, 2)
+            self.add(self.tee, 1)
+        store = get_cart_store()
+        self.assertIsNone(store.thread)
+        mocked.register.assert_called_once_with(store.close)
+        self.assertEqual(self.stored(), {})
+        store.close()
+        self.assertEqual(self.stored(), {'Cap': 2, 'Tee': 1})
+
+    def test_reflects_catalog_changes(self):
+        self.add(self.cap, 1)
+        self.add(self.tee, 2)
+        self.cap.price = Decimal('5.05')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cap.save()
+        self.assertEqual(self.client.get('/api/cart/').json()['total_value'], 45.45)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tee.delete()
+        cart = self.client.get('/api/cart/').json()
+        self.assertEqual([item['product']['name'] for item in cart['items']], ['Cap'])
+        get_cart_store().flush()
+        self.assertEqual(self.stored(), {'Cap': 1})
+        self.assertEqual(list(Cart.objects.drifted()), [])
+
+    def test_loads_carts_without_the_shard_lock(self):
+        store = get_cart_store()
+        load = store.load
+
+        def unlocked_load(user):
+            self.assertFalse(store.shard(user.pk).lock.locked())
+            return load(user)
+
+        with mock.patch.object(store, 'load', side_effect=unlocked_load) as mocked:
+            self.assertEqual(self.client.get('/api/cart/').status_code, 200)
+        self.assertEqual(mocked.call_count, 1)
+
+    @override_settings(CART_STORE_OPTIONS={'flush_interval': None, 'max_products': 1})
+    def test_product_cache_is_bounded(self):
+        self.add(self.cap, 1)
+        cart = self.add(self.tee, 1)
+        self.assertEqual([item['product']['name'] for item in cart['items']], ['Cap', 'Tee'])
+        self.assertEqual(len(get_cart_store().products), 1)
+
+    @override_settings(ROOT_URLCONF='api.async_urls')
+    async def test_async_cart_view(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.post('/api/cart/', {'product_id': self.cap.pk, 'quantity': 2}, 'application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((await client.get('/api/cart/')).json()['item_count'], 2)
+        self.assertEqual((await client.delete('/api/cart/')).status_code, 204)
+
+
+class ApiBenchmarkTests(TestCase):
+    def run_api_benchmark(self, **overrides):
+        options = {
+            'products': 50, 'users': 3, 'requests': 60, 'seed': 1, 'base_url': None, 'auth': None,
+            **overrides,
+        }
+        return SCENARIOS['api'](options)
+
+    def test_reports_every_endpoint(self):
+        caches['catalog'].clear()
+        results = self.run_api_benchmark()
+        self.assertEqual(sum(e['requests'] for e in results['endpoints'].values()), 60)
+        listing = results['endpoints']['GET /api/products/']
+        self.assertEqual(set(listing['latency_ms']), {'mean', 'p50', 'p95', 'p99'})
+        self.assertIsNotNone(listing['queries_mean'])
+
+    def test_async_scenario_compares_sync_and_async_views(self):
+        results = SCENARIOS['async']({'products': 30, 'threads': 2, 'operations': 5, 'seed': 1})
+        self.assertEqual(set(results['results']), {'sync', 'async'})
+        self.assertGreater(results['results']['async']['throughput_rps'], 0)
+
+    def test_auth_scenario(self):
+        results = SCENARIOS['auth']({'users': 3, 'operations': 6, 'seed': 1})['results']
+        self.assertLess(results['token']['queries_per_request'], results['db_session']['queries_per_request'])
+        self.assertLess(results['cached_session']['queries_per_request'], results['db_session']['queries_per_request'])
+
+    def test_startup_scenario(self):
+        results = SCENARIOS['startup']({'repeat': 1})['results']
+        self.assertLess(results['api_only']['modules'], results['full']['modules'])
+
+    def test_serializers_scenario(self):
+        results = SCENARIOS['serializers']({'products': 20, 'repeat': 1, 'seed': 1})
+        self.assertEqual(set(results['results']), {'product_list', 'brand_list', 'cart'})
+        self.assertTrue(all(r['identical'] for r in results['results'].values()))
+
+    def test_compare_reports_relative_change(self):
+        endpoint = {'latency_ms': {'p50': 2.0, 'p95': 4.0}, 'queries_mean': 4.0}
+        faster = {'latency_ms': {'p50': 1.0, 'p95': 4.0}, 'queries_mean': 2.0}
+        lines = compare(
+            {'endpoints': {'GET /api/cart/': endpoint}},
+            {'endpoints': {'GET /api/cart/': faster, 'GET /api/brands/': endpoint}},
+        )
+        self.assertEqual(lines, [
+            'GET /api/cart/: p50 2.0 -> 1.0 (-50.0%), p95 4.0 -> 4.0 (+0.0%), queries 4.0 -> 2.0 (-50.0%)',
+            'GET /api/brands/: new endpoint',
+        ])
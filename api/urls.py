@@ -1,17 +1,50 @@
+from django.conf import settings
 from django.urls import path
+from django.utils.module_loading import import_string
 from .views import (
     BrandListCreate,
     BrandRetrieveUpdateDestroy,
     ProductListCreate,
+    ProductFacets,
+    ProductPriceStats,
+    ProductExport,
+    ProductImport,
     ProductRetrieveUpdateDestroy,
     CartView,
+    CartItemsBulkView,
+    AuthToken,
+    AuthTokenRevoke,
+    MetricsView,
 )
 
-urlpatterns = [
-    path('brands/', BrandListCreate.as_view(), name='brand-list-create'),
-    path('brands/<int:pk>/', BrandRetrieveUpdateDestroy.as_view(), name='brand-retrieve-update-destroy'),
-    path('products/', ProductListCreate.as_view(), name='product-list-create'),
-    path('products/<int:pk>/', ProductRetrieveUpdateDestroy.as_view(), name='product-retrieve-update-destroy'),
-    path('cart/', CartView.as_view(), name='cart'),
-]
+# Routes with an ASGI-native variant; enable them by name in API_ASYNC_ROUTES.
+# Dotted paths, so workers that enable none never import api.async_views.
+ASYNC_VIEWS = {
+    'product-list-create': 'api.async_views.AsyncProductListCreate',
+    'product-retrieve-update-destroy': 'api.async_views.AsyncProductRetrieveUpdateDestroy',
+    'cart': 'api.async_views.AsyncCartView',
+}
 
+def api_urlpatterns(async_routes=()):
+    def route(pattern, view, name):
+        if name in async_routes:
+            view = import_string(ASYNC_VIEWS[name])
+        return path(pattern, view.as_view(), name=name)
+
+    return [
+        route('brands/', BrandListCreate, 'brand-list-create'),
+        route('brands/<int:pk>/', BrandRetrieveUpdateDestroy, 'brand-retrieve-update-destroy'),
+        route('products/', ProductListCreate, 'product-list-create'),
+        route('products/facets/', ProductFacets, 'product-facets'),
+        route('products/price-stats/', ProductPriceStats, 'product-price-stats'),
+        route('products/export/', ProductExport, 'product-export'),
+        route('products/import/', ProductImport, 'product-import'),
+        route('products/<int:pk>/', ProductRetrieveUpdateDestroy, 'product-retrieve-update-destroy'),
+        route('cart/', CartView, 'cart'),
+        route('cart/items/', CartItemsBulkView, 'cart-items-bulk'),
+        route('auth/token/', AuthToken, 'auth-token'),
+        route('auth/token/revoke/', AuthTokenRevoke, 'auth-token-revoke'),
+        route('metrics/', MetricsView, 'metrics'),
+    ]
+
+urlpatterns = api_urlpatterns(settings.API_ASYNC_ROUTES)
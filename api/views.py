@@ -1,78 +1,400 @@
-from rest_framework import generics, status, filters
+import codecs
+import csv
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import generics, status, filters, serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
-from .models import Brand, Product, Cart, CartItem
-from .serializers import BrandSerializer, ProductSerializer, CartSerializer, CartItemSerializer
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from .auth import issue_token, revoke_tokens
+from .cache import get_catalog_cache, response_cache_key
+from .cart_store import get_cart_store
+from .conditional import cart_validators, catalog_validators, not_modified, set_validators
+from .export import FORMATS, export_catalog
+from .fast_serializers import brand_rows, decimal_to_string, product_rows
+from .imports import import_catalog
+from .metrics import registry
+from .models import Brand, PriceBucket, Product, ProductFacet, price_bucket_width
+from .pagination import ProductKeysetPagination
+from .serializers import (
+    BrandSerializer, ProductSerializer, CartItemSerializer, CartBulkSerializer,
+)
 
 class BrandListCreate(generics.ListCreateAPIView):
-    queryset = Brand.objects.all()
+    # Explicit, or SQLite returns name order only when the unique index on
+    # name happens to cover the query.
+    queryset = Brand.objects.order_by('name')
     serializer_class = BrandSerializer
 
+    def list(self, request, *args, **kwargs):
+        if not settings.API_FAST_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+        return Response(brand_rows.data(self.get_queryset()))
+
 class BrandRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
 
-class ProductListCreate(generics.ListCreateAPIView):
-    queryset = Product.objects.all()
+CENT = Decimal('0.01')
+
+def parse_price(params, name):
+    """The `name` price bound from `params` as a Decimal, None if absent, or ValidationError."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite():
+        raise serializers.ValidationError({name: ['A valid number is required.']})
+    return price
+
+def filter_products(queryset, params):
+    """Applies the list filters in `params`; raises ValidationError for malformed price bounds."""
+    gender = params.get('gender')
+    category = params.get('category')
+    brand_name = params.get('brand')
+    min_price = parse_price(params, 'min_price')
+    max_price = parse_price(params, 'max_price')
+    query = params.get('q')
+
+    if query:
+        queryset = queryset.search(query)
+    if gender:
+        queryset = queryset.filter_by_gender(gender)
+    if category:
+        queryset = queryset.filter(category=category)
+    if brand_name:
+        queryset = queryset.filter_by_brand(brand_name)
+    if min_price is not None or max_price is not None:
+        queryset = queryset.price_range(min_price, max_price)
+
+    return queryset
+
+class CatalogCacheMixin:
+    """Serves successful GET responses from the catalog cache, and 304s to clients that have them."""
+    cache_params = ()
+
+    def cached_response(self, prefix, handler, request, *args, **kwargs):
+        cache = get_catalog_cache()
+        key = response_cache_key(prefix, request.get_host(), request.query_params, self.cache_params)
+        validators = catalog_validators(key, request.accepted_renderer.format)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        data = cache.get(key)
+        if data is not None:
+            return set_validators(Response(data), validators)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        return set_validators(response, validators)
+
+class ProductListCreate(CatalogCacheMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.select_related('brand')
     serializer_class = ProductSerializer
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['price']
+    pagination_class = ProductKeysetPagination
+    cache_params = (
+        'q', 'gender', 'category', 'brand', 'min_price', 'max_price', 'ordering', 'cursor', 'page_size',
+    )
+
+    def list(self, request, *args, **kwargs):
+        handler = self.fast_list if settings.API_FAST_SERIALIZERS else super().list
+        return self.cached_response('product-list', handler, request, *args, **kwargs)
+
+    def fast_list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginator.page_queryset(queryset, request)
+        if page is None:
+            return Response(product_rows.data(queryset))
+        rows = self.paginator.paginate_results(list(product_rows.rows(page)), product_rows.position)
+        return self.paginator.get_paginated_response(product_rows.serialize(rows))
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        gender = self.request.query_params.get('gender')
-        category = self.request.query_params.get('category')
-        brand_name = self.request.query_params.get('brand')
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
+        return filter_products(super().get_queryset(), self.request.query_params)
 
-        if gender:
-            queryset = queryset.filter_by_gender(gender)
+class ProductFacets(CatalogCacheMixin, APIView):
+    """Counts per category, gender, brand and price range for the current filters."""
+    cache_params = ('q', 'gender', 'category', 'brand', 'min_price', 'max_price')
+
+    def get(self, request):
+        return self.cached_response('product-facets', self.facets, request)
+
+    def facets(self, request):
+        params = request.query_params
+        if any(params.get(name) for name in ('q', 'min_price', 'max_price')):
+            # The summary table can't answer text or arbitrary price filters,
+            # so group the matching products directly.
+            rows = filter_products(Product.objects.all(), params).facet_counts()
+        else:
+            rows = ProductFacet.objects.filter_by(
+                gender=params.get('gender'),
+                category=params.get('category'),
+                brand_name=params.get('brand'),
+            ).facet_counts()
+
+        category = dict.fromkeys((key for key, _ in Product.CATEGORY_CHOICES), 0)
+        gender = dict.fromkeys((key for key, _ in Product.GENDER_CHOICES), 0)
+        price_range = dict.fromkeys((key for key, _, _ in Product.PRICE_RANGES), 0)
+        brand = {}
+        total = 0
+        for row in rows:
+            count = row['count']
+            total += count
+            category[row['category']] = category.get(row['category'], 0) + count
+            gender[row['gender']] = gender.get(row['gender'], 0) + count
+            price_range[row['price_range']] += count
+            brand[row['brand__name']] = brand.get(row['brand__name'], 0) + count
+
+        return Response({
+            'total': total,
+            'facets': {
+                'category': category,
+                'gender': gender,
+                'brand': dict(sorted(brand.items())),
+                'price_range': price_range,
+            },
+        })
+
+def histogram_quantile(buckets, total, q, low, high):
+    """
+    Estimates the `q` quantile from (bucket, count) pairs by interpolating
+    linearly within the bucket it falls in. `low` and `high` are the exact
+    minimum and maximum, which bound the first and last buckets.
+    """
+    rank = q * total
+    seen = 0
+    for bucket, count in buckets:
+        if seen + count >= rank:
+            lower = max(Decimal(bucket), low)
+            upper = min(Decimal(bucket + price_bucket_width(bucket)), high)
+            return (lower + (upper - lower) * Decimal(rank - seen) / count).quantize(CENT)
+        seen += count
+    return high
+
+class ProductPriceStats(CatalogCacheMixin, APIView):
+    """
+    Price distribution for a category and/or gender, from the PriceBucket
+    histogram; only the minimum and maximum are read from the products, by index.
+    """
+    cache_params = ('category', 'gender')
+    quantiles = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+    def get(self, request):
+        return self.cached_response('product-price-stats', self.stats, request)
+
+    def stats(self, request):
+        category, gender = request.query_params.get('category'), request.query_params.get('gender')
+        buckets = list(PriceBucket.objects.filter_by(category=category, gender=gender).histogram())
+        total = sum(count for _, count in buckets)
+        if not total:
+            return Response({
+                'count': 0, 'min': None, 'max': None,
+                'quantiles': dict.fromkeys(self.labels(), None), 'buckets': [],
+            })
+
+        prices = Product.objects.all()
         if category:
-            queryset = queryset.filter(category=category)
-        if brand_name:
-            queryset = queryset.filter(brand__name__iexact=brand_name)
-        if min_price and max_price:
-            queryset = queryset.price_range(min_price, max_price)
+            prices = prices.filter(category=category)
+        if gender:
+            prices = prices.filter(gender=gender)
+        prices = prices.values_list('price', flat=True)
+        low, high = prices.order_by('price').first(), prices.order_by('-price').first()
+        return Response({
+            'count': total,
+            'min': decimal_to_string(low),
+            'max': decimal_to_string(high),
+            'quantiles': {
+                label: decimal_to_string(histogram_quantile(buckets, total, q, low, high))
+                for label, q in zip(self.labels(), self.quantiles)
+            },
+            'buckets': [
+                {
+                    'min': decimal_to_string(Decimal(bucket).quantize(CENT)),
+                    'max': decimal_to_string(Decimal(bucket + price_bucket_width(bucket)).quantize(CENT)),
+                    'count': count,
+                }
+                for bucket, count in buckets
+            ],
+        })
+
+    def labels(self):
+        return [f'p{q * 100:g}' for q in self.quantiles]
 
-        return queryset
+class ProductExport(View):
+    """
+    Streams the whole catalog, or the products matching the list filters,
+    as NDJSON (default) or a JSON array (`?format=json`). The body is
+    gzip-compressed when the client accepts it.
+    """
 
-class ProductRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+    def get(self, request):
+        format = request.GET.get('format', 'ndjson')
+        if format not in FORMATS:
+            return JsonResponse(
+                {'detail': f"Unsupported format. Choose one of: {', '.join(FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            queryset = filter_products(Product.objects.all(), request.GET)
+        except serializers.ValidationError as error:
+            return JsonResponse(error.detail, status=status.HTTP_400_BAD_REQUEST)
+        compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+        response = StreamingHttpResponse(
+            export_catalog(queryset, format, compress), content_type=FORMATS[format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="catalog.{format}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+class ProductImport(APIView):
+    """
+    Upserts products from a CSV (`text/csv`) or NDJSON
+    (`application/x-ndjson`) request body, see api.imports. The body is
+    parsed as it is read rather than loaded whole.
+    """
+    permission_classes = [IsAdminUser]
+    content_types = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}
+
+    def post(self, request):
+        format = self.content_types.get(request.content_type)
+        if format is None:
+            return Response(
+                {'detail': f"Unsupported media type. Send one of: {', '.join(self.content_types)}."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        # request.stream is the unread body; iterating it yields lines.
+        lines = codecs.iterdecode(request.stream or [], 'utf-8')
+        try:
+            result = import_catalog(lines, format)
+        except UnicodeDecodeError:
+            return Response({'detail': 'Body must be UTF-8.'}, status=status.HTTP_400_BAD_REQUEST)
+        except csv.Error as error:
+            return Response({'detail': f'Malformed CSV: {error}'}, status=status.HTTP_400_BAD_REQUEST)
+        if not result.imported and result.rejected:
+            return Response(result.report(), status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.report())
+
+class ProductRetrieveUpdateDestroy(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.select_related('brand')
     serializer_class = ProductSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        handler = self.fast_retrieve if settings.API_FAST_SERIALIZERS else super().retrieve
+        return self.cached_response(f"product-{kwargs['pk']}", handler, request, *args, **kwargs)
+
+    def fast_retrieve(self, request, *args, **kwargs):
+        row = product_rows.rows(self.get_queryset().filter(pk=kwargs['pk'])).first()
+        if row is None:
+            raise Http404('No Product matches the given query.')
+        return Response(product_rows.serialize([row])[0])
+
 class CartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        store = get_cart_store()
+        validators = cart_validators(store.version(request.user), request.accepted_renderer.format)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        return set_validators(Response(store.get(request.user)), validators)
 
     def post(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
         # We expect product_id and quantity in request.data
         serializer = CartItemSerializer(data=request.data)
         if serializer.is_valid():
             product = serializer.validated_data['product']
-            quantity = serializer.validated_data['quantity']
-            
-            # Check if item already exists in cart, update quantity if so
-            cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-            else:
-                cart_item.quantity = quantity
-                cart_item.save()
-
-            return Response(CartSerializer(cart).data, status=status.HTTP_201_CREATED)
+            quantity = serializer.validated_data.get('quantity', 1)
+            cart = get_cart_store().add(request.user, product, quantity)
+            return Response(cart, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def delete(self, request):
         # Clear the entire cart
-        cart = get_object_or_404(Cart, user=request.user)
-        cart.items.all().delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        if not get_cart_store().clear(request.user):
+            raise Http404('No Cart matches the given query.')
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class CartItemsBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data['items']
+        known = set(
+            Product.objects.filter(pk__in={item['product_id'] for item in items})
+            .values_list('pk', flat=True)
+        )
+        does_not_exist = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+        quantities, errors = {}, []
+        for index, item in enumerate(items):
+            product_id = item['product_id']
+            if product_id not in known:
+                errors.append({
+                    'index': index,
+                    'product_id': product_id,
+                    'error': does_not_exist.format(pk_value=product_id),
+                })
+                continue
+            quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
+
+        if not quantities:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        cart = get_cart_store().add_many(request.user, quantities)
+        return Response(
+            {'cart': cart, 'errors': errors},
+            status=status.HTTP_201_CREATED,
+        )
+
+class AuthToken(APIView):
+    """Exchanges a username and password for a signed API token (see api.auth)."""
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request):
+        serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response({'token': issue_token(serializer.validated_data['user'])})
+
+class AuthTokenRevoke(APIView):
+    """Revokes every token issued to the requesting user."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        revoke_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint. With API_METRICS_TOKEN set it requires that
+    bearer token; otherwise it only answers loopback and INTERNAL_IPS
+    clients, which is no protection behind a reverse proxy on the same host.
+    """
+    local_addresses = {'127.0.0.1', '::1'}
+
+    def get(self, request):
+        if not self.allowed(request):
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def allowed(self, request):
+        if settings.API_METRICS_TOKEN:
+            keyword, _, token = request.headers.get('Authorization', '').partition(' ')
+            return keyword.lower() == 'bearer' and constant_time_compare(token, settings.API_METRICS_TOKEN)
+        return request.META.get('REMOTE_ADDR') in self.local_addresses | set(settings.INTERNAL_IPS)
@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from api import profiling
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_practice.settings')
 
-application = get_asgi_application()
+# API_PROFILE_IMPORTS=1 reports the import time of every module loaded here.
+with profiling.startup('asgi startup'):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
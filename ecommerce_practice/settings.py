@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so profiles cover the whole stack; removes itself at rate 0.
+    'api.middleware.ProfilingMiddleware',
+    # First of the rest, so its timings cover the rest of the stack.
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,8 +56,44 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Performance instrumentation (api.middleware.PerformanceMiddleware).
+# Requests that exceed either budget have their SQL logged by the
+# 'api.performance' logger; None disables the check.
+PERFORMANCE_QUERY_BUDGET = None
+PERFORMANCE_LATENCY_BUDGET_MS = None
+# Recent samples per route kept for the p50/p95/p99 quantiles.
+PERFORMANCE_SAMPLE_WINDOW = 1024
+# Bearer token required by /api/metrics/. Without one the endpoint only
+# answers loopback and INTERNAL_IPS clients, which a reverse proxy on the
+# same host defeats: every request it forwards comes from 127.0.0.1.
+API_METRICS_TOKEN = os.environ.get('API_METRICS_TOKEN')
+
+# Sampled request profiling (api.middleware.ProfilingMiddleware), set from
+# the environment: API_PROFILE_REQUESTS=0.01 runs 1% of requests under
+# cProfile and writes their profiles to API_PROFILE_DIR. For import times
+# at startup, see api.profiling (API_PROFILE_IMPORTS=1).
+PROFILE_REQUEST_RATE = float(os.environ.get('API_PROFILE_REQUESTS', '0'))
+PROFILE_DIR = os.environ.get('API_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
 ROOT_URLCONF = 'ecommerce_practice.urls'
 
+# API routes served by their ASGI-native views (api.async_views) instead of
+# the sync DRF views, e.g. {'product-list-create', 'cart'}. See
+# api.urls.ASYNC_VIEWS for the routes that have one.
+API_ASYNC_ROUTES = set()
+
+# Serve product, brand and cart reads through the row serializers in
+# api.fast_serializers instead of DRF's ModelSerializers. The JSON is
+# identical; see `manage.py benchmark serializers` for the difference.
+API_FAST_SERIALIZERS = False
+
+# Where the cart views keep carts. 'api.cart_store.WriteBehindCartStore'
+# serves them from process memory and writes them back in batches; it
+# needs every request for a user to reach the same process. Options are
+# passed to the store class, e.g. {'flush_interval': 1.0, 'max_dirty': 1000}.
+CART_STORE = 'api.cart_store.DatabaseCartStore'
+CART_STORE_OPTIONS = {}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -75,13 +116,117 @@ WSGI_APPLICATION = 'ecommerce_practice.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# WAL lets readers run while a write is in progress; synchronous=NORMAL is
+# durable across application crashes in WAL mode. Transactions begin
+# IMMEDIATE so a transaction that reads and then writes can't fail on an
+# upgraded lock; it waits up to `timeout` seconds for the writer instead.
+SQLITE_INIT_COMMAND = (
+    'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; '
+    'PRAGMA mmap_size=268435456; PRAGMA cache_size=-65536; PRAGMA temp_store=MEMORY'
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND,
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+    # The same file opened query-only. api.routers.ReadReplicaRouter sends
+    # catalog reads here; point NAME at a replicated copy to offload them.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND + '; PRAGMA query_only=ON',
+            'timeout': 20,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['api.routers.ReadReplicaRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Upper bound on cached catalog responses; least recently used entries are
+# evicted first.
+CATALOG_CACHE_MAX_ENTRIES = 1000
+
+# Production runs several processes, which must share one cache: catalog
+# invalidations, logouts and token revocations are made in one process and
+# have to reach all of them. Set API_REDIS_URL (e.g. redis://127.0.0.1:6379/0)
+# there; Redis evicts least recently used keys with
+# `maxmemory-policy allkeys-lru`. Without it the caches are per-process
+# local memory, which is only right for development and the test suite
+# (`manage.py check --deploy` warns about it).
+REDIS_URL = os.environ.get('API_REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'default',
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'catalog',
+            'TIMEOUT': 300,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'catalog',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': CATALOG_CACHE_MAX_ENTRIES,
+                # Evict one entry at a time instead of a third of the cache.
+                'CULL_FREQUENCY': CATALOG_CACHE_MAX_ENTRIES,
+            },
+        },
     }
+
+# Authentication
+# The user behind a session or an API token is read from the default cache
+# (api.auth), so authenticating a request needs no queries on a warm cache.
+# With several processes the default cache must be shared (API_REDIS_URL), or
+# logouts and revocations reach only the process that made them. Sessions are
+# only cached when it is: a per-process copy would outlive a logout elsewhere.
+
+AUTHENTICATION_BACKENDS = ['api.auth.CachedModelBackend']
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if REDIS_URL else 'django.contrib.sessions.backends.db'
+)
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+        'api.auth.SignedTokenAuthentication',
+    ],
 }
 
+# Lifetime of signed API tokens (POST /api/auth/token/), in seconds.
+API_TOKEN_MAX_AGE = 14 * 24 * 60 * 60
+# How long a cached user may serve requests; saves and deletes drop it sooner.
+API_USER_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,35 @@
+"""
+Settings for API-only workers:
+
+    DJANGO_SETTINGS_MODULE=ecommerce_practice.settings_api gunicorn ecommerce_practice.wsgi
+
+Everything in ecommerce_practice.settings, minus what only the admin and
+HTML pages use: the admin, messages and static files apps, their
+middleware, the template engine and DRF's browsable API. Workers import
+less at startup and run less middleware per request. Serve the admin from
+workers on the full settings.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in {'django.contrib.admin', 'django.contrib.messages', 'django.contrib.staticfiles'}
+]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in {
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    }
+]
+
+ROOT_URLCONF = 'ecommerce_practice.urls_api'
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
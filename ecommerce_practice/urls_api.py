@@ -0,0 +1,6 @@
+"""URL configuration for API-only workers (ecommerce_practice.settings_api): no admin."""
+from django.urls import include, path
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+]
@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from api import profiling
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_practice.settings')
 
-application = get_wsgi_application()
+# API_PROFILE_IMPORTS=1 reports the import time of every module loaded here.
+with profiling.startup('wsgi startup'):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()